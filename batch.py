@@ -0,0 +1,231 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import traceback
+from slide_agent import image_utils
+from slide_agent.async_slide_ops import AsyncSlidesClient, AsyncPresentationSnapshot, generate_deck_thumbnails_async
+from slide_agent.image_utils import ingest_images
+from slide_agent.metrics import METRICS
+from slide_agent.presentation_model import Content, TEMPLATE_LAYOUTS
+from slide_agent.slide_gen import generate_presentation_async
+from slide_agent.slide_stream import IncrementalDeckWriter
+from slide_agent.thumbnail_cache import ThumbnailCache
+
+# Headless batch generation: one deck per manifest line, on a bounded pool of workers.
+#
+#     python batch.py jobs.jsonl --workers 8 --gemini 4 --s3 16 --slides 8 --output report.jsonl
+#
+# A manifest line is a JSON object:
+#
+#     {"id": "lecture-01", "source": "notes/01.txt", "images": "figures/01",
+#      "presentation_id": "<id or docs.google.com URL>", "title": "...", "language": "English"}
+#
+# `images` is a directory or a list of image paths (optional). The presentation must be a
+# fresh copy of the template, one per job: its slides are replaced by the generated deck.
+
+DEFAULT_WORKERS = 4
+DEFAULT_GEMINI_CONCURRENCY = 4
+DEFAULT_S3_CONCURRENCY = 16
+DEFAULT_SLIDES_CONCURRENCY = 8
+
+
+def load_manifest(path):
+    with open(path, encoding="utf-8") as f:
+        jobs = [json.loads(line) for line in f if line.strip()]
+
+    decks = {}
+    for i, job in enumerate(jobs):
+        job.setdefault("id", str(i))
+        if "source" not in job or "presentation_id" not in job:
+            raise ValueError(f"Job {job['id']} needs 'source' and 'presentation_id'")
+
+        # Every job rewrites its deck in place: two jobs on one deck would race on it
+        deck = presentation_id_of(job["presentation_id"])
+        if deck in decks:
+            raise ValueError(f"Jobs {decks[deck]} and {job['id']} write to the same presentation {deck}; "
+                             "give each job its own copy of the template")
+        decks[deck] = job["id"]
+
+    return jobs
+
+
+def presentation_id_of(value):
+    # Accept the edit URL as well, like the chat settings do
+    if value.startswith("http"):
+        return value.split("/")[5]
+
+    return value
+
+
+async def run_job(job, limits, client, thumbnails=None):
+    stages = {}
+    started = time.perf_counter()
+
+    def mark(stage, stage_started):
+        stages[stage] = time.perf_counter() - stage_started
+
+    with open(job["source"], encoding="utf-8") as f:
+        content = f.read()
+
+    title = job.get("title") or next((line.strip() for line in content.splitlines() if line.strip()), job["id"])
+
+    presentation_id = presentation_id_of(job["presentation_id"])
+    snapshot = AsyncPresentationSnapshot(presentation_id, client)
+
+    # Captions and uploads run on threads, capped process-wide by image_utils.set_concurrency().
+    # Images are downscaled to the template's largest image placeholder.
+    stage_started = time.perf_counter()
+    images = []
+    if job.get("images"):
+        template = await snapshot.refresh()
+        images = await asyncio.to_thread(lambda: list(ingest_images(job["images"], presentation=template)))
+    mark("images", stage_started)
+
+    deps = Content(title=title, content=content, images=images, language=job.get("language", "English"))
+
+    # Summaries of long sources and the agent run share the Gemini limit; each call
+    # holds a slot only while it runs, so a job never waits on its own slot
+    stage_started = time.perf_counter()
+    presentation = await generate_presentation_async(deps, gemini_slots=limits["gemini"])
+    mark("generate", stage_started)
+
+    stage_started = time.perf_counter()
+    writer = IncrementalDeckWriter(presentation_id, snapshot, job.get("template_layouts", TEMPLATE_LAYOUTS))
+    try:
+        await writer.start()
+        await writer.finish(presentation.slides)
+    finally:
+        await writer.close()
+    mark("slides", stage_started)
+
+    if thumbnails is not None:
+        stage_started = time.perf_counter()
+        await generate_deck_thumbnails_async(
+            presentation_id, os.path.join(thumbnails["dir"], presentation_id), snapshot, cache=thumbnails["cache"]
+        )
+        mark("thumbnails", stage_started)
+
+    return {
+        "images": len(images),
+        "slides": len(presentation.slides),
+        "seconds": time.perf_counter() - started,
+        "stages": stages,
+    }
+
+
+async def run_batch(jobs, workers, limits, client, report, thumbnails=None):
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+
+    results = []
+
+    async def worker():
+        while not queue.empty():
+            job = queue.get_nowait()
+            started = time.perf_counter()
+
+            try:
+                result = {"id": job["id"], "status": "ok", **await run_job(job, limits, client, thumbnails)}
+            except Exception as e:
+                traceback.print_exc()
+                result = {
+                    "id": job["id"],
+                    "status": "failed",
+                    "error": f"{type(e).__name__}: {e}",
+                    "seconds": time.perf_counter() - started,
+                }
+
+            print(f"[{len(results) + 1}/{len(jobs)}] {job['id']}: {result['status']} in {result['seconds']:.1f}s")
+            results.append(result)
+            report(result)
+
+    await asyncio.gather(*(worker() for _ in range(min(workers, len(jobs)))))
+    return results
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize_batch(results, wall_seconds):
+    ok = [result for result in results if result["status"] == "ok"]
+    latencies = [result["seconds"] for result in ok]
+
+    return {
+        "jobs": len(results),
+        "succeeded": len(ok),
+        "failed": len(results) - len(ok),
+        "failures": {result["id"]: result["error"] for result in results if result["status"] != "ok"},
+        "wall_seconds": wall_seconds,
+        "decks_per_hour": len(ok) / wall_seconds * 3600 if wall_seconds else None,
+        "latency_p50": _percentile(latencies, 0.5),
+        "latency_p95": _percentile(latencies, 0.95),
+        "latency_max": max(latencies) if latencies else None,
+        "stages": METRICS.snapshot(),
+    }
+
+
+async def main_async(args):
+    jobs = load_manifest(args.manifest)
+
+    # One Gemini limit for captioning threads, summaries and agent runs
+    image_utils.set_concurrency(gemini=args.gemini, s3=args.s3)
+    limits = {"gemini": image_utils.gemini_slots()}
+    client = AsyncSlidesClient(max_connections=args.slides, max_concurrency=args.slides)
+
+    thumbnails = None
+    if args.thumbnails:
+        thumbnails = {"dir": args.thumbnails, "cache": ThumbnailCache()}
+
+    out = open(args.output, "a", encoding="utf-8") if args.output else None
+
+    def report(result):
+        if out is not None:
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+
+    started = time.perf_counter()
+    try:
+        results = await run_batch(jobs, args.workers, limits, client, report, thumbnails)
+    finally:
+        await client.aclose()
+        if out is not None:
+            out.close()
+
+    summary = summarize_batch(results, time.perf_counter() - started)
+    print(json.dumps({key: value for key, value in summary.items() if key != "stages"}, indent=2))
+
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"summary": summary}) + "\n")
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate many decks from a manifest of jobs")
+    parser.add_argument("manifest", help="JSON lines, one job per line")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="jobs in progress at once")
+    parser.add_argument("--gemini", type=int, default=DEFAULT_GEMINI_CONCURRENCY,
+                        help="concurrent Gemini calls: agent runs and summaries, and captioning")
+    parser.add_argument("--s3", type=int, default=DEFAULT_S3_CONCURRENCY, help="concurrent S3 requests")
+    parser.add_argument("--slides", type=int, default=DEFAULT_SLIDES_CONCURRENCY,
+                        help="concurrent Slides API requests")
+    parser.add_argument("--thumbnails", help="also render thumbnails into this directory")
+    parser.add_argument("--output", help="append per-job results and the summary here as JSON lines")
+    args = parser.parse_args()
+
+    summary = asyncio.run(main_async(args))
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
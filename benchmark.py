@@ -0,0 +1,185 @@
+import argparse
+import contextlib
+import io
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+from slide_agent.fake_slides import FakeSlidesService, make_template_presentation, slide_layouts, LAYOUT_IMAGE_COUNT
+from slide_agent.presentation_model import Presentation, Slide, BulletPoints, Description, TEMPLATE_LAYOUTS
+from slide_agent.presentation_snapshot import PresentationSnapshot
+from slide_agent.slide_gen import (
+    delete_unnecessary_slide,
+    copy_slide,
+    move_slide,
+    prepare_template,
+    update_presentation_content,
+)
+from slide_agent.util import RETRY_STATS, SLIDES_READ_LIMITER, SLIDES_WRITE_LIMITER, SLIDES_EXPENSIVE_READ_LIMITER
+
+# Offline benchmark of template preparation and content update against FakeSlidesService.
+# Prints one JSON object per (deck size, pipeline, stage) so runs can be diffed between commits:
+#
+#     python benchmark.py --sizes 5 20 100 500 --output bench.jsonl
+
+PRESENTATION_ID = "benchmark-deck"
+BODY_LAYOUTS = ["only text", "text, image 25%", "text and image equal, 50%-50%", "image, text 25%",
+                "only image", "text and 4 images", "text and 2 images"]
+
+
+def make_presentation(n_slides):
+    slides = []
+
+    for i in range(n_slides):
+        if i == 0:
+            layout = "cover"
+        elif i == n_slides - 1:
+            layout = "closing"
+        else:
+            layout = BODY_LAYOUTS[(i * 5) % len(BODY_LAYOUTS)]
+
+        if i % 2:
+            body_text = BulletPoints(subject=f"Subject {i}", points=[f"Point {i}.{j}" for j in range(4)])
+        else:
+            body_text = Description(text=f"Description of slide {i}. " * 8)
+
+        slides.append(
+            Slide(
+                title=f"Slide {i}",
+                body_text=body_text,
+                layout=layout,
+                image_urls=[f"https://example.com/image/{i}_{j}.png" for j in range(LAYOUT_IMAGE_COUNT.get(layout, 0))],
+                page=i + 1,
+            )
+        )
+
+    return Presentation(title=f"Synthetic deck of {n_slides} slides", slides=slides)
+
+
+def measure(service, stage, func):
+    service.reset_counters()
+    RETRY_STATS.reset()
+    tracemalloc.reset_peak()
+    mem_before = tracemalloc.get_traced_memory()[0]
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func()
+    wall_time = time.perf_counter() - start
+
+    record = {
+        "stage": stage,
+        "wall_time_s": round(wall_time, 6),
+        "round_trips": sum(service.calls.values()),
+        "calls": dict(service.calls),
+        "request_bytes": service.request_bytes,
+        "peak_memory_bytes": tracemalloc.get_traced_memory()[1] - mem_before,
+        "retries": RETRY_STATS.as_dict()["retries"],
+    }
+
+    return result, record
+
+
+def deck_layouts(service):
+    return slide_layouts(service.presentations().get(presentationId=PRESENTATION_ID).execute())
+
+
+def run_staged(service, layouts, slides):
+    # The original three-phase template preparation, then the content update
+    records = []
+    curr_template = list(TEMPLATE_LAYOUTS)
+
+    for stage, func in [("delete_unnecessary_slide", delete_unnecessary_slide),
+                        ("copy_slide", copy_slide),
+                        ("move_slide", move_slide)]:
+        curr_template, record = measure(
+            service, stage,
+            lambda: func(PRESENTATION_ID, layouts, curr_template, PresentationSnapshot(PRESENTATION_ID, service))
+        )
+        records.append(record)
+
+    assert curr_template == layouts
+    assert deck_layouts(service) == layouts
+    _, record = measure(
+        service, "update_presentation_content",
+        lambda: update_presentation_content(PRESENTATION_ID, slides, PresentationSnapshot(PRESENTATION_ID, service))
+    )
+    records.append(record)
+
+    return records
+
+
+def run_single(service, layouts, slides):
+    # prepare_template and the content update sharing one snapshot, as stream.py does
+    snapshot = PresentationSnapshot(PRESENTATION_ID, service)
+    records = []
+
+    curr_template, record = measure(
+        service, "prepare_template",
+        lambda: prepare_template(PRESENTATION_ID, layouts, list(TEMPLATE_LAYOUTS), snapshot)
+    )
+    records.append(record)
+
+    assert curr_template == layouts
+    assert deck_layouts(service) == layouts
+    _, record = measure(
+        service, "update_presentation_content",
+        lambda: update_presentation_content(PRESENTATION_ID, slides, snapshot)
+    )
+    records.append(record)
+
+    return records
+
+
+PIPELINES = {"staged": run_staged, "single": run_single}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark deck generation stages against a fake Slides API")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 20, 100, 500])
+    parser.add_argument("--pipelines", nargs="+", choices=list(PIPELINES), default=list(PIPELINES))
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every fake API call")
+    parser.add_argument("--rate-limit", action="store_true", help="keep the Slides quota limiters enabled")
+    parser.add_argument("--output", help="write JSON lines here instead of stdout")
+    args = parser.parse_args()
+
+    for limiter in (SLIDES_READ_LIMITER, SLIDES_WRITE_LIMITER, SLIDES_EXPENSIVE_READ_LIMITER):
+        limiter.enabled = args.rate_limit
+
+    commit = git_commit()
+    out = open(args.output, "w") if args.output else sys.stdout
+    tracemalloc.start()
+
+    try:
+        for n_slides in args.sizes:
+            presentation = make_presentation(n_slides)
+            layouts = [slide.layout for slide in presentation.slides]
+
+            for pipeline in args.pipelines:
+                service = FakeSlidesService(latency=args.latency)
+                service.add_presentation(make_template_presentation(PRESENTATION_ID))
+
+                for record in PIPELINES[pipeline](service, layouts, presentation.slides):
+                    record = {"commit": commit, "n_slides": n_slides, "pipeline": pipeline, **record}
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+
+                    print(f"{n_slides:>5} {pipeline:<7} {record['stage']:<28} {record['wall_time_s']:>9.3f}s "
+                          f"{record['round_trips']:>5} calls {record['request_bytes']:>10} B "
+                          f"{record['peak_memory_bytes']:>11} B peak", file=sys.stderr)
+    finally:
+        tracemalloc.stop()
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import asyncio
+import httpx
+import json
+import os
+import shutil
+from .google_slide_auth import google_slide_auth, credentials_expiring
+from .google_slide_ops import SlideOps
+from .metrics import METRICS
+from .presentation_snapshot import PresentationSnapshot
+from .thumbnail_cache import page_fingerprint
+from .util import (
+    MAX_RETRIES,
+    RETRYABLE_STATUS,
+    WRITE_RETRYABLE_STATUS,
+    RETRY_STATS,
+    SLIDES_EXPENSIVE_READ_LIMITER,
+    SLIDES_READ_LIMITER,
+    SLIDES_WRITE_LIMITER,
+    parse_retry_after,
+    retry_delay,
+)
+
+SLIDES_API_URL = "https://slides.googleapis.com/v1"
+MAX_CONNECTIONS = 20
+THUMBNAIL_CONCURRENCY = 8
+
+
+class AsyncSlidesClient:
+    # Slides v1 REST calls over one pooled httpx.AsyncClient, with the same retry
+    # and quota handling as call_api_decorator but without blocking the event loop.
+    def __init__(self, creds=None, http_client=None, max_connections=MAX_CONNECTIONS, max_concurrency=None):
+        if http_client is None:
+            http_client = httpx.AsyncClient(
+                base_url=SLIDES_API_URL,
+                timeout=httpx.Timeout(30.0),
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            )
+
+        self.creds = creds
+        self.http = http_client
+        self._auth_lock = asyncio.Lock()
+        # Calls in flight at once (not counting backoff sleeps); None leaves it to the pool
+        self._slots = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+    async def _auth_headers(self):
+        async with self._auth_lock:
+            # The shared credential cache refreshes ahead of expiry; only hop to a thread when it has to
+            if self.creds is None or credentials_expiring(self.creds):
+                self.creds = await asyncio.to_thread(google_slide_auth)
+
+        return {"Authorization": f"Bearer {self.creds.token}"}
+
+    async def request(self, method, url, limiter=None, auth=True, stage="slides.request", idempotent=True, **kwargs):
+        with METRICS.timed(stage):
+            return await self._request(method, url, limiter, auth, stage, idempotent, **kwargs)
+
+    async def _request(self, method, url, limiter, auth, stage, idempotent, **kwargs):
+        # Same rule as call_api_decorator: writes are only retried when they surely weren't applied
+        retryable_status = RETRYABLE_STATUS if idempotent else WRITE_RETRYABLE_STATUS
+        attempt = 0
+        while True:
+            if limiter is not None:
+                throttled = limiter.reserve()
+                RETRY_STATS.record(throttled_seconds=throttled)
+                if throttled > 0:
+                    await asyncio.sleep(throttled)
+
+            headers = await self._auth_headers() if auth else {}
+            RETRY_STATS.record(calls=1)
+
+            try:
+                if self._slots is not None:
+                    async with self._slots:
+                        response = await self.http.request(method, url, headers=headers, **kwargs)
+                else:
+                    response = await self.http.request(method, url, headers=headers, **kwargs)
+            except httpx.TransportError as e:
+                unsent = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+                if attempt >= MAX_RETRIES or not (idempotent or unsent):
+                    RETRY_STATS.record(failures=1)
+                    print(e)
+                    raise
+
+                delay = retry_delay(attempt)
+                print(f"Retrying {method} {url} in {delay:.1f}s (attempt {attempt + 1}/{MAX_RETRIES}): {e}")
+            else:
+                if response.status_code < 400:
+                    return response
+
+                if response.status_code not in retryable_status or attempt >= MAX_RETRIES:
+                    RETRY_STATS.record(failures=1)
+                    print(f"{method} {url} failed with {response.status_code}: {response.text}")
+                    response.raise_for_status()
+
+                delay = retry_delay(attempt, parse_retry_after(response.headers.get("retry-after")))
+                print(f"Retrying {method} {url} in {delay:.1f}s (attempt {attempt + 1}/{MAX_RETRIES}): "
+                      f"HTTP {response.status_code}")
+
+            RETRY_STATS.record(retries=1, backoff_seconds=delay)
+            METRICS.record_retry(stage)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def get_presentation(self, presentation_id):
+        response = await self.request("GET", f"/presentations/{presentation_id}", limiter=SLIDES_READ_LIMITER,
+                                      stage="slides.get")
+        return response.json()
+
+    async def batch_update(self, presentation_id, requests):
+        body = {"requests": requests}
+        METRICS.record_payload("slides.batch_update", len(json.dumps(body)))
+
+        response = await self.request(
+            "POST",
+            f"/presentations/{presentation_id}:batchUpdate",
+            limiter=SLIDES_WRITE_LIMITER,
+            stage="slides.batch_update",
+            idempotent=False,
+            json=body,
+        )
+        return response.json()
+
+    async def get_thumbnail(self, presentation_id, page_id, mime_type=None, size=None):
+        params = {}
+        if mime_type is not None:
+            params["thumbnailProperties.mimeType"] = mime_type
+        if size is not None:
+            params["thumbnailProperties.thumbnailSize"] = size
+
+        response = await self.request(
+            "GET",
+            f"/presentations/{presentation_id}/pages/{page_id}/thumbnail",
+            limiter=SLIDES_EXPENSIVE_READ_LIMITER,
+            stage="slides.thumbnail",
+            params=params,
+        )
+        return response.json()
+
+    async def download(self, url):
+        # contentUrl is a short-lived public link, it must not receive our token
+        response = await self.request("GET", url, auth=False, stage="slides.thumbnail_download")
+        return response.content
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+_shared_client = None
+
+
+def get_async_slides_client():
+    # One connection pool per process, shared by every chat session
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = AsyncSlidesClient()
+
+    return _shared_client
+
+
+class AsyncPresentationSnapshot(PresentationSnapshot):
+    def __init__(self, presentation_id, client=None):
+        self.presentation_id = presentation_id
+        self.client = client if client is not None else get_async_slides_client()
+        self.service = None
+        self._presentation = None
+
+    @property
+    def presentation(self):
+        # Reads can't await, so the snapshot has to be loaded up front
+        if self._presentation is None:
+            raise RuntimeError(f"Snapshot of {self.presentation_id} is not loaded, await refresh() first")
+
+        return self._presentation
+
+    async def refresh(self):
+        self._presentation = await self.client.get_presentation(self.presentation_id)
+        return self._presentation
+
+    async def ensure_loaded(self):
+        if self._presentation is None:
+            await self.refresh()
+
+        return self._presentation
+
+    async def batch_update(self, requests):
+        response = await self.client.batch_update(self.presentation_id, requests)
+        self.apply_replies(requests, response)
+
+        return response
+
+
+class AsyncSlideOps(SlideOps):
+    # Request builders are inherited; everything that talks to the API is awaitable.
+    def __init__(self, presentation_id, page, snapshot):
+        super().__init__(presentation_id, page, snapshot=snapshot)
+        self.client = snapshot.client
+
+    async def call_batch_update(self, requests):
+        return await self.snapshot.batch_update(requests)
+
+    async def get_thumbnail(self, mime_type=None, size=None):
+        return await self.client.get_thumbnail(self.presentation_id, self.page_id, mime_type, size)
+
+    async def generate_thumbnail(self, output_path, thumbnail_properties=None):
+        thumbnail_properties = thumbnail_properties or {}
+        response = await self.get_thumbnail(
+            mime_type=thumbnail_properties.get("mimeType"),
+            size=thumbnail_properties.get("thumbnailSize"),
+        )
+
+        # Keep the bytes as rendered, no decode/encode round trip
+        img_data = await self.client.download(response.get("contentUrl"))
+        await asyncio.to_thread(_write_bytes, output_path, img_data)
+
+        print(f"Thumbnail saved to '{output_path}'")
+        return output_path
+
+
+async def generate_deck_thumbnails_async(presentation_id, output_dir, snapshot=None, thumbnail_properties=None,
+                                         max_concurrency=THUMBNAIL_CONCURRENCY, cache=None):
+    # Thumbnails of every slide, at most `max_concurrency` in flight; returns the paths in slide order.
+    # With a ThumbnailCache, only pages whose content changed are rendered again.
+    if snapshot is None:
+        snapshot = AsyncPresentationSnapshot(presentation_id)
+        await snapshot.refresh()
+    elif cache is not None:
+        # Fingerprints need the server's view: the local snapshot doesn't mirror text edits
+        await snapshot.refresh()
+    else:
+        await snapshot.ensure_loaded()
+
+    os.makedirs(output_dir, exist_ok=True)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def generate(idx):
+        output_path = os.path.join(output_dir, f"{idx}.png")
+        page = snapshot.slides[idx]
+
+        if cache is not None:
+            fingerprint = page_fingerprint(page, thumbnail_properties)
+            cached_path = await asyncio.to_thread(cache.get, presentation_id, page["objectId"], fingerprint)
+            if cached_path is not None:
+                await asyncio.to_thread(shutil.copyfile, cached_path, output_path)
+                return output_path
+
+        async with semaphore:
+            s = AsyncSlideOps(presentation_id, page=idx, snapshot=snapshot)
+            await s.generate_thumbnail(output_path, thumbnail_properties)
+
+        if cache is not None:
+            await asyncio.to_thread(cache.put, presentation_id, page["objectId"], fingerprint, output_path)
+
+        return output_path
+
+    paths = list(await asyncio.gather(*(generate(idx) for idx in range(len(snapshot.slides)))))
+
+    if cache is not None:
+        await asyncio.to_thread(cache.evict)
+        print(f"Thumbnail cache: {cache.stats()}")
+
+    return paths
+
+
+def _write_bytes(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
@@ -0,0 +1,42 @@
+import hashlib
+import os
+import threading
+from .sqlite_cache import SqliteCache
+
+CAPTION_CACHE_PATH = os.environ.get("SLIDE_GEN_CAPTION_CACHE", os.path.join(".cache", "captions.sqlite3"))
+CAPTION_CACHE_TTL = 30 * 24 * 3600
+CAPTION_CACHE_MAX_ENTRIES = 10000
+
+
+def caption_key(image_bytes, prompt, model):
+    # The same bytes captioned with another prompt or model is another entry
+    h = hashlib.sha256()
+    for part in (model.encode(), prompt.encode(), image_bytes):
+        h.update(len(part).to_bytes(8, "big"))
+        h.update(part)
+
+    return h.hexdigest()
+
+
+class CaptionCache(SqliteCache):
+    # Captions and image dimensions keyed by caption_key(); get() returns
+    # (caption, width, height) or None
+    table = "captions"
+    columns = (("caption", "TEXT"), ("width", "INTEGER"), ("height", "INTEGER"))
+
+    def __init__(self, path=CAPTION_CACHE_PATH, ttl=CAPTION_CACHE_TTL, max_entries=CAPTION_CACHE_MAX_ENTRIES):
+        super().__init__(path, ttl, max_entries)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_caption_cache():
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = CaptionCache()
+
+        return _cache
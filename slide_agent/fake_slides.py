@@ -0,0 +1,504 @@
+import copy
+import json
+import random
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter, deque
+import httplib2
+from googleapiclient.errors import HttpError
+from .presentation_model import TEMPLATE_LAYOUTS
+
+# In-process stand-in for the Slides v1 endpoints this project uses. It is a drop-in
+# for `build("slides", "v1", ...)`:
+#
+#     service = FakeSlidesService(latency=0.05)
+#     service.add_presentation(make_template_presentation("deck"))
+#     snapshot = PresentationSnapshot("deck", service=service)
+
+FAKE_THUMBNAIL_URL = "https://fake-slides.local/thumbnails"
+
+# Image placeholders per template layout
+LAYOUT_IMAGE_COUNT = {
+    "text, image 25%": 1,
+    "text and image equal, 50%-50%": 1,
+    "image, text 25%": 1,
+    "only image": 1,
+    "text and 4 images": 4,
+    "text and 2 images": 2,
+    "graph": 1,
+}
+
+EMU_PER_PX = 9525
+SLIDE_WIDTH_EMU = 1920 * EMU_PER_PX
+SLIDE_HEIGHT_EMU = 1080 * EMU_PER_PX
+
+
+def _size(width, height):
+    return {
+        "width": {"magnitude": width, "unit": "EMU"},
+        "height": {"magnitude": height, "unit": "EMU"},
+    }
+
+
+def _transform(x, y):
+    return {"scaleX": 1, "scaleY": 1, "translateX": x, "translateY": y, "unit": "EMU"}
+
+
+def _text_shape(object_id, text, x, y, width, height):
+    return {
+        "objectId": object_id,
+        "size": _size(width, height),
+        "transform": _transform(x, y),
+        "shape": {
+            "shapeType": "TEXT_BOX",
+            "text": {"textElements": [{"textRun": {"content": text}}]},
+        },
+    }
+
+
+def _image(object_id, url, x, y, width, height):
+    return {
+        "objectId": object_id,
+        "size": _size(width, height),
+        "transform": _transform(x, y),
+        "image": {"sourceUrl": url, "contentUrl": url},
+    }
+
+
+def make_template_presentation(presentation_id, layouts=TEMPLATE_LAYOUTS, title="Template"):
+    slides = []
+
+    for i, layout in enumerate(layouts):
+        page_id = f"page_{i:04d}"
+        elements = [
+            _text_shape(f"{page_id}_title", layout, 0, 0, SLIDE_WIDTH_EMU, SLIDE_HEIGHT_EMU // 6),
+            _text_shape(f"{page_id}_body", "", 0, SLIDE_HEIGHT_EMU // 6, SLIDE_WIDTH_EMU // 2, SLIDE_HEIGHT_EMU // 2),
+        ]
+
+        n_images = LAYOUT_IMAGE_COUNT.get(layout, 0)
+        for j in range(n_images):
+            width = SLIDE_WIDTH_EMU // (2 * n_images)
+            elements.append(
+                _image(f"{page_id}_image_{j}", "https://fake-slides.local/placeholder.png",
+                       SLIDE_WIDTH_EMU // 2 + j * width, SLIDE_HEIGHT_EMU // 6, width, SLIDE_HEIGHT_EMU // 2)
+            )
+
+        slides.append({"objectId": page_id, "pageType": "SLIDE", "pageElements": elements})
+
+    return {
+        "presentationId": presentation_id,
+        "title": title,
+        "revisionId": uuid.uuid4().hex,
+        "pageSize": _size(SLIDE_WIDTH_EMU, SLIDE_HEIGHT_EMU),
+        "slides": slides,
+    }
+
+
+def slide_layouts(presentation):
+    # Layout of each slide of a make_template_presentation() deck, read back from the
+    # title placeholder, which holds the layout name until the content is written
+    return [
+        "".join(run.get("textRun", {}).get("content", "")
+                for run in slide["pageElements"][0]["shape"]["text"]["textElements"])
+        for slide in presentation["slides"]
+    ]
+
+
+def make_png(width=16, height=9, rgb=(255, 255, 255)):
+    # Tiny solid-colour PNG so thumbnails have real bytes without needing PIL
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    row = b"\x00" + bytes(rgb) * width
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(row * height))
+        + chunk(b"IEND", b"")
+    )
+
+
+def make_http_error(status, message, retry_after=None):
+    info = {"status": status}
+    if retry_after is not None:
+        info["retry-after"] = str(retry_after)
+
+    content = json.dumps({"error": {"code": status, "message": message}}).encode()
+    return HttpError(httplib2.Response(info), content)
+
+
+def _clone(presentation):
+    # Presentations are plain JSON, and a JSON round trip is much cheaper than deepcopy
+    return json.loads(json.dumps(presentation))
+
+
+def _text_of(container):
+    return "".join(
+        element.get("textRun", {}).get("content", "")
+        for element in container.get("text", {}).get("textElements", [])
+    )
+
+
+def _set_text(container, text):
+    container["text"] = {"textElements": [{"textRun": {"content": text}}] if text else []}
+
+
+def _text_range(text, text_range):
+    kind = text_range.get("type", "ALL")
+    if kind == "ALL":
+        return 0, len(text)
+    if kind == "FROM_START_INDEX":
+        return text_range.get("startIndex", 0), len(text)
+
+    return text_range.get("startIndex", 0), text_range.get("endIndex", len(text))
+
+
+class _Call:
+    # Mimics googleapiclient's HttpRequest: nothing happens until execute()
+    def __init__(self, service, method, handler, body=None):
+        self.service = service
+        self.method = method
+        self.handler = handler
+        self.body = body
+
+    def execute(self, num_retries=0):
+        return self.service.execute(self.method, self.handler, self.body)
+
+
+class _PagesResource:
+    def __init__(self, service):
+        self.service = service
+
+    def getThumbnail(self, presentationId, pageObjectId, **params):
+        return _Call(self.service, "pages.getThumbnail",
+                     lambda: self.service.get_thumbnail(presentationId, pageObjectId))
+
+
+class _PresentationsResource:
+    def __init__(self, service):
+        self.service = service
+
+    def get(self, presentationId):
+        return _Call(self.service, "presentations.get",
+                     lambda: self.service.get_presentation(presentationId))
+
+    def batchUpdate(self, presentationId, body):
+        return _Call(self.service, "presentations.batchUpdate",
+                     lambda: self.service.batch_update(presentationId, body.get("requests", [])), body)
+
+    def pages(self):
+        return _PagesResource(self.service)
+
+
+class FakeSlidesService:
+    def __init__(self, presentations=None, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503,
+                 quota_per_minute=None, retry_after=None, seed=None):
+        # latency/jitter: seconds added to every call
+        # error_rate: share of calls failing with `error_status`
+        # quota_per_minute: {method: limit}, calls above it within 60s fail with 429
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.quota_per_minute = quota_per_minute or {}
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+        self.store = {}
+        self._ids = set()
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.errors = Counter()
+        self.request_bytes = 0
+        self._recent_calls = {}
+
+        for presentation in presentations or []:
+            self.add_presentation(presentation)
+
+    def add_presentation(self, presentation):
+        with self.lock:
+            self.store[presentation["presentationId"]] = _clone(presentation)
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls.clear()
+            self.errors.clear()
+            self.request_bytes = 0
+
+    def presentations(self):
+        return _PresentationsResource(self)
+
+    def execute(self, method, handler, body=None):
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+        with self.lock:
+            self.calls[method] += 1
+            if body is not None:
+                self.request_bytes += len(json.dumps(body))
+
+            error = self._injected_error(method)
+            if error is not None:
+                self.errors[method] += 1
+                raise error
+
+            return handler()
+
+    def _injected_error(self, method):
+        limit = self.quota_per_minute.get(method)
+        if limit is not None:
+            now = time.monotonic()
+            recent = self._recent_calls.setdefault(method, deque())
+            while recent and now - recent[0] > 60:
+                recent.popleft()
+
+            if len(recent) >= limit:
+                return make_http_error(429, f"Quota exceeded for {method}", self.retry_after)
+            recent.append(now)
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            return make_http_error(self.error_status, f"Injected failure for {method}", self.retry_after)
+
+        return None
+
+    def _get(self, presentation_id):
+        if presentation_id not in self.store:
+            raise make_http_error(404, f"Requested entity was not found: {presentation_id}")
+
+        return self.store[presentation_id]
+
+    def get_presentation(self, presentation_id):
+        return _clone(self._get(presentation_id))
+
+    def get_thumbnail(self, presentation_id, page_id):
+        presentation = self._get(presentation_id)
+        if not any(slide["objectId"] == page_id for slide in presentation["slides"]):
+            raise make_http_error(400, f"Invalid page object id: {page_id}")
+
+        return {
+            "width": 1600,
+            "height": 900,
+            "contentUrl": f"{FAKE_THUMBNAIL_URL}/{presentation_id}/{page_id}.png",
+        }
+
+    def thumbnail_bytes(self, content_url):
+        # What downloading a `contentUrl` returned by getThumbnail would give
+        return make_png()
+
+    def batch_update(self, presentation_id, requests):
+        # All or nothing, like the real API
+        presentation = _clone(self._get(presentation_id))
+        self._ids = self._all_ids(presentation)
+        replies = [self._apply(presentation, request) for request in requests]
+
+        presentation["revisionId"] = uuid.uuid4().hex
+        self.store[presentation_id] = presentation
+
+        return {
+            "presentationId": presentation_id,
+            "replies": replies,
+            "writeControl": {"requiredRevisionId": presentation["revisionId"]},
+        }
+
+    def _apply(self, presentation, request):
+        kind, params = next(iter(request.items()))
+        handler = getattr(self, f"_apply_{kind}", None)
+        if handler is None:
+            raise make_http_error(400, f"Unsupported request: {kind}")
+
+        return handler(presentation, params)
+
+    # --- object lookup ----------------------------------------------------------
+
+    def _all_ids(self, presentation):
+        ids = set()
+        for slide in presentation["slides"]:
+            ids.add(slide["objectId"])
+            ids.update(element["objectId"] for element in slide.get("pageElements", []))
+
+        return ids
+
+    def _find_slide(self, presentation, object_id):
+        for idx, slide in enumerate(presentation["slides"]):
+            if slide["objectId"] == object_id:
+                return idx
+
+        return None
+
+    def _find_element(self, presentation, object_id):
+        for slide in presentation["slides"]:
+            for element in slide.get("pageElements", []):
+                if element["objectId"] == object_id:
+                    return slide, element
+
+        raise make_http_error(400, f"The object ({object_id}) could not be found.")
+
+    def _new_id(self, presentation, object_id=None):
+        # self._ids holds the ids of the presentation being updated by the current batch
+        if object_id is None:
+            object_id = f"fake_{uuid.uuid4().hex}"
+        elif object_id in self._ids:
+            raise make_http_error(400, f"The object ID ({object_id}) should be unique.")
+
+        self._ids.add(object_id)
+        return object_id
+
+    def _text_container(self, presentation, params):
+        _, element = self._find_element(presentation, params["objectId"])
+
+        if "cellLocation" in params:
+            location = params["cellLocation"]
+            rows = element["table"]["tableRows"]
+            return rows[location.get("rowIndex", 0)]["tableCells"][location.get("columnIndex", 0)]
+        if "shape" not in element:
+            raise make_http_error(400, f"The object ({params['objectId']}) has no text.")
+
+        return element["shape"]
+
+    # --- requests ---------------------------------------------------------------
+
+    def _apply_deleteObject(self, presentation, params):
+        idx = self._find_slide(presentation, params["objectId"])
+        if idx is not None:
+            slide = presentation["slides"].pop(idx)
+            self._ids.discard(slide["objectId"])
+            self._ids.difference_update(element["objectId"] for element in slide.get("pageElements", []))
+            return {}
+
+        slide, element = self._find_element(presentation, params["objectId"])
+        slide["pageElements"].remove(element)
+        self._ids.discard(element["objectId"])
+        return {}
+
+    def _apply_duplicateObject(self, presentation, params):
+        object_ids = params.get("objectIds", {})
+        idx = self._find_slide(presentation, params["objectId"])
+
+        if idx is not None:
+            duplicate = copy.deepcopy(presentation["slides"][idx])
+            for element in duplicate.get("pageElements", []):
+                element["objectId"] = self._new_id(presentation, object_ids.get(element["objectId"]))
+            duplicate["objectId"] = self._new_id(presentation, object_ids.get(duplicate["objectId"]))
+
+            presentation["slides"].insert(idx + 1, duplicate)
+        else:
+            slide, element = self._find_element(presentation, params["objectId"])
+            duplicate = copy.deepcopy(element)
+            duplicate["objectId"] = self._new_id(presentation, object_ids.get(element["objectId"]))
+            slide["pageElements"].append(duplicate)
+
+        return {"duplicateObject": {"objectId": duplicate["objectId"]}}
+
+    def _apply_updateSlidesPosition(self, presentation, params):
+        slides = presentation["slides"]
+        insertion_index = params["insertionIndex"]
+        if not 0 <= insertion_index <= len(slides):
+            raise make_http_error(400, f"insertionIndex {insertion_index} is out of range.")
+
+        positions = []
+        for slide_id in params["slideObjectIds"]:
+            idx = self._find_slide(presentation, slide_id)
+            if idx is None:
+                raise make_http_error(400, f"The object ({slide_id}) could not be found.")
+            positions.append(idx)
+
+        moved = [slides[idx] for idx in positions]
+        insertion_index -= sum(1 for idx in positions if idx < insertion_index)
+        for idx in sorted(positions, reverse=True):
+            slides.pop(idx)
+
+        slides[insertion_index:insertion_index] = moved
+        return {}
+
+    def _apply_insertText(self, presentation, params):
+        container = self._text_container(presentation, params)
+        text = _text_of(container)
+        idx = params.get("insertionIndex", 0)
+        if not 0 <= idx <= len(text):
+            raise make_http_error(400, f"insertionIndex {idx} is out of range.")
+
+        _set_text(container, text[:idx] + params["text"] + text[idx:])
+        return {}
+
+    def _apply_deleteText(self, presentation, params):
+        container = self._text_container(presentation, params)
+        text = _text_of(container)
+        start, end = _text_range(text, params.get("textRange", {}))
+
+        _set_text(container, text[:start] + text[end:])
+        return {}
+
+    def _apply_createParagraphBullets(self, presentation, params):
+        container = self._text_container(presentation, params)
+        container["bulletPreset"] = params.get("bulletPreset")
+        return {}
+
+    def _apply_createImage(self, presentation, params):
+        properties = params["elementProperties"]
+        idx = self._find_slide(presentation, properties["pageObjectId"])
+        if idx is None:
+            raise make_http_error(400, f"The page ({properties['pageObjectId']}) could not be found.")
+
+        element = {
+            "objectId": self._new_id(presentation, params.get("objectId")),
+            "size": properties.get("size"),
+            "transform": properties.get("transform"),
+            "image": {"sourceUrl": params["url"], "contentUrl": params["url"]},
+        }
+        presentation["slides"][idx].setdefault("pageElements", []).append(element)
+        return {"createImage": {"objectId": element["objectId"]}}
+
+    def _apply_createTable(self, presentation, params):
+        properties = params["elementProperties"]
+        idx = self._find_slide(presentation, properties["pageObjectId"])
+        if idx is None:
+            raise make_http_error(400, f"The page ({properties['pageObjectId']}) could not be found.")
+
+        element = {
+            "objectId": self._new_id(presentation, params.get("objectId")),
+            "table": {
+                "rows": params["rows"],
+                "columns": params["columns"],
+                "tableRows": [
+                    {"tableCells": [{"text": {"textElements": []}} for _ in range(params["columns"])]}
+                    for _ in range(params["rows"])
+                ],
+            },
+        }
+        presentation["slides"][idx].setdefault("pageElements", []).append(element)
+        return {"createTable": {"objectId": element["objectId"]}}
+
+    # --- httpx ------------------------------------------------------------------
+
+    def as_httpx_transport(self):
+        # Serve the REST routes AsyncSlidesClient uses, for `httpx.AsyncClient(transport=...)`
+        import httpx
+
+        def handle(request):
+            path = request.url.path
+            try:
+                if path.startswith("/thumbnails/"):
+                    return httpx.Response(200, content=self.thumbnail_bytes(str(request.url)))
+
+                path = path.removeprefix("/v1/presentations/")
+                if request.method == "POST" and path.endswith(":batchUpdate"):
+                    presentation_id = path.removesuffix(":batchUpdate")
+                    body = json.loads(request.content or b"{}")
+                    result = self.presentations().batchUpdate(presentationId=presentation_id, body=body).execute()
+                elif "/pages/" in path and path.endswith("/thumbnail"):
+                    presentation_id, page_id = path.removesuffix("/thumbnail").split("/pages/")
+                    result = self.presentations().pages().getThumbnail(
+                        presentationId=presentation_id, pageObjectId=page_id).execute()
+                else:
+                    result = self.presentations().get(presentationId=path).execute()
+            except HttpError as e:
+                headers = {"retry-after": e.resp["retry-after"]} if "retry-after" in e.resp else {}
+                return httpx.Response(e.resp.status, headers=headers, content=e.content)
+
+            return httpx.Response(200, json=result)
+
+        return httpx.MockTransport(handle)
@@ -1,12 +1,32 @@
+import json
 import os.path
+import threading
+from datetime import datetime, timedelta, timezone
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
 
 # If modifying these scopes, delete the file token.json.
 SCOPES = ["https://www.googleapis.com/auth/presentations"]
 
-def google_slide_auth():
+# Refresh the access token this long before it expires, so no call goes out with a stale one
+REFRESH_MARGIN = timedelta(minutes=5)
+
+_creds = None
+_creds_lock = threading.Lock()
+_discovery_doc = None
+_local = threading.local()
+
+
+def _save_credentials(creds):
+    # Save the credentials for the next run
+    with open("token.json", "w") as token:
+        token.write(creds.to_json())
+
+
+def _load_credentials():
     creds = None
     # The file token.json stores the user's access and refresh tokens, and is
     # created automatically when the authorization flow completes for the first time.
@@ -21,8 +41,58 @@ def google_slide_auth():
             flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
             creds = flow.run_local_server(port=0)
 
-        # Save the credentials for the next run
-        with open("token.json", "w") as token:
-            token.write(creds.to_json())
+        _save_credentials(creds)
+
+    return creds
+
+
+def credentials_expiring(creds, margin=REFRESH_MARGIN):
+    if not creds.valid:
+        return True
+    if creds.expiry is None:
+        return False
+
+    # google-auth keeps expiry as a naive UTC datetime
+    return creds.expiry - margin <= datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def google_slide_auth():
+    # Process-wide credentials: token.json is read once, then the token is
+    # refreshed in memory shortly before it expires.
+    global _creds
+
+    with _creds_lock:
+        if _creds is None:
+            _creds = _load_credentials()
+        elif credentials_expiring(_creds):
+            if _creds.refresh_token:
+                _creds.refresh(Request())
+                _save_credentials(_creds)
+            else:
+                _creds = _load_credentials()
+
+        return _creds
+
+
+def _slides_discovery_doc():
+    global _discovery_doc
+
+    # Parse the bundled discovery document once per process
+    if _discovery_doc is None:
+        _discovery_doc = json.loads(discovery_cache.get_static_doc("slides", "v1"))
+
+    return _discovery_doc
+
+
+def get_slides_service():
+    # httplib2 connections are not thread-safe, so every thread keeps its own ready
+    # service object. Services share the cached credentials and discovery document.
+    creds = google_slide_auth()
+
+    service = getattr(_local, "service", None)
+    if service is None or _local.creds is not creds:
+        service = build_from_document(_slides_discovery_doc(), credentials=creds)
+        _local.service = service
+        _local.creds = creds
 
-    return creds
\ No newline at end of file
+    return service
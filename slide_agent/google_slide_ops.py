@@ -1,39 +1,98 @@
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from .google_slide_auth import google_slide_auth
-from .util import call_api_decorator
+from concurrent.futures import ThreadPoolExecutor
+from .google_slide_auth import get_slides_service
+from .metrics import METRICS
+from .presentation_snapshot import PresentationSnapshot
+from .thumbnail_cache import page_fingerprint
+from .util import call_api_decorator, SLIDES_EXPENSIVE_READ_LIMITER
+import os
+import shutil
+import threading
 import uuid
-from PIL import Image
 import requests
-import io
+from requests.adapters import HTTPAdapter
+
+THUMBNAIL_WORKERS = 8
+DOWNLOAD_TIMEOUT = (5, 30)
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    # One keep-alive connection pool for thumbnail downloads, sized to the worker count
+    global _http_session
+
+    with _http_session_lock:
+        if _http_session is None:
+            _http_session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=THUMBNAIL_WORKERS)
+            _http_session.mount("https://", adapter)
+            _http_session.mount("http://", adapter)
+
+        return _http_session
+
+
+@call_api_decorator(limiter=SLIDES_EXPENSIVE_READ_LIMITER, stage="slides.thumbnail")
+def get_page_thumbnail(service, presentation_id, page_id, thumbnail_properties=None):
+    # thumbnail_properties e.g. {"mimeType": "PNG", "thumbnailSize": "MEDIUM"}
+    params = {f"thumbnailProperties.{key}": value for key, value in (thumbnail_properties or {}).items()}
+
+    return service.presentations().pages().getThumbnail(
+        presentationId=presentation_id,
+        pageObjectId=page_id,
+        **params
+    ).execute()
+
+
+def download_thumbnail(thumbnail_url, output_path, session=None):
+    session = session or get_http_session()
+
+    # Write the rendered bytes as they are, no decode/encode round trip
+    with METRICS.timed("slides.thumbnail_download"):
+        response = session.get(thumbnail_url, timeout=DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+
+    with open(output_path, "wb") as f:
+        f.write(response.content)
+
+    return output_path
+
 
 class SlideOps:
-    def __init__(self, presentation_id, page):
-        # Authentication Google Slide API
-        creds = google_slide_auth()
+    def __init__(self, presentation_id, page, snapshot=None, service=None):
+        # Share one fetched presentation between all page-level operations.
+        # `service` replaces the discovery client, e.g. with a FakeSlidesService.
+        if snapshot is None:
+            snapshot = PresentationSnapshot(presentation_id, service=service)
 
         self.presentation_id = presentation_id
-        self.service = build("slides", "v1", credentials=creds)
+        self.snapshot = snapshot
+        self.service = snapshot.service
 
-        # Call the Slides API
-        try:
-            self.presentation = (
-                self.service.presentations().get(presentationId = self.presentation_id).execute()
-            )
-        except HttpError as e:
-            print(e)
-
-        self.slides = self.presentation.get("slides")
         self.page = page
         self.page_id = self.get_page_id()
 
+    @property
+    def presentation(self):
+        return self.snapshot.presentation
+
+    @property
+    def slides(self):
+        return self.snapshot.slides
+
+    @property
+    def slide(self):
+        # Resolve by id so earlier deletes/moves on the shared snapshot don't shift this page
+        return self.snapshot.get_slide(self.page_id)
+
     def get_page_id(self):
         return self.slides[self.page].get('objectId')
 
     def get_text_objects(self):
         text_obj_id = []
 
-        for element in self.slides[self.page].get('pageElements'):
+        for element in self.slide.get('pageElements', []):
             if 'shape' in element.keys() and 'text' in element['shape'].keys():
             # if 'image' in element.keys():     # Get image IDs
                 text_obj_id.append(element['objectId'])
@@ -43,7 +102,7 @@ class SlideOps:
     def get_image_objects(self):
         image_obj_id = []
 
-        for element in self.slides[self.page].get('pageElements'):
+        for element in self.slide.get('pageElements', []):
             if 'image' in element.keys():     # Get image IDs
                 image_obj_id.append(element['objectId'])
 
@@ -95,7 +154,7 @@ class SlideOps:
 
     def insert_image(self, shape_id, image_url):
         element = None
-        for page_element in self.slides[self.page]['pageElements']:
+        for page_element in self.slide.get('pageElements', []):
             if page_element.get('objectId') == shape_id:
                 element = page_element
                 break
@@ -132,7 +191,7 @@ class SlideOps:
                         'objectId': f'{shape_id}_new_image',  # New object ID
                         'url': image_url,
                         'elementProperties': {
-                            'pageObjectId': self.get_page_id(),
+                            'pageObjectId': self.page_id,
                             'size': {
                                 'width': {
                                     'magnitude': width,
@@ -246,14 +305,8 @@ class SlideOps:
         return self.call_batch_update(requests)
 
 
-    @call_api_decorator
     def call_batch_update(self, requests):
-        body = {"requests": requests}
-        response = self.service.presentations().batchUpdate(
-            presentationId = self.presentation_id, body=body
-        ).execute()
-
-        return response
+        return self.snapshot.batch_update(requests)
 
     def delete_slide(self):
         requests = [
@@ -291,28 +344,65 @@ class SlideOps:
 
         return self.call_batch_update(requests)
 
-    def generate_thumbnail(self, output_path, thumbnail_properties):
-        try:
-            params = {'pageObjectId': self.page_id}
+    def get_thumbnail(self, thumbnail_properties=None):
+        return get_page_thumbnail(self.service, self.presentation_id, self.page_id, thumbnail_properties)
 
-            response = self.service.presentations().pages().getThumbnail(
-                presentationId=self.presentation_id,
-                **params
-            ).execute()
-
-            # Extract the thumbnail URL
-            thumbnail_url = response.get('contentUrl')
+    def generate_thumbnail(self, output_path, thumbnail_properties=None):
+        try:
+            response = self.get_thumbnail(thumbnail_properties)
 
-            # Download the thumbnail image
-            img_data = requests.get(thumbnail_url).content
-            img = Image.open(io.BytesIO(img_data))
-            img.save(output_path)
+            # Extract the thumbnail URL and download the thumbnail image
+            download_thumbnail(response.get('contentUrl'), output_path)
 
             print(f"Thumbnail saved to '{output_path}'")
-        except HttpError as e:
+        except (HttpError, requests.RequestException) as e:
             print(e)
 
 
+def generate_deck_thumbnails(presentation_id, output_dir, snapshot=None, service=None,
+                             thumbnail_properties=None, max_workers=THUMBNAIL_WORKERS, cache=None):
+    # Thumbnails of every slide, fetched concurrently; returns the paths in slide order.
+    # Without `service`, each worker thread uses its own pooled Slides service.
+    # With a ThumbnailCache, only pages whose content changed are rendered again.
+    if snapshot is None:
+        snapshot = PresentationSnapshot(presentation_id, service=service)
+    elif cache is not None:
+        # Fingerprints need the server's view: the local snapshot doesn't mirror text edits
+        snapshot.refresh()
+
+    slides = snapshot.slides
+    os.makedirs(output_dir, exist_ok=True)
+
+    def generate(idx):
+        output_path = os.path.join(output_dir, f"{idx}.png")
+        page_id = slides[idx].get('objectId')
+
+        if cache is not None:
+            fingerprint = page_fingerprint(slides[idx], thumbnail_properties)
+            cached_path = cache.get(presentation_id, page_id, fingerprint)
+            if cached_path is not None:
+                shutil.copyfile(cached_path, output_path)
+                return output_path
+
+        response = get_page_thumbnail(service or get_slides_service(), presentation_id, page_id, thumbnail_properties)
+        download_thumbnail(response.get('contentUrl'), output_path)
+
+        if cache is not None:
+            cache.put(presentation_id, page_id, fingerprint, output_path)
+
+        return output_path
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        paths = list(executor.map(generate, range(len(slides))))
+
+    if cache is not None:
+        cache.evict()
+        print(f"Thumbnail cache: {cache.stats()}")
+
+    print(f"Saved {len(paths)} thumbnails to '{output_dir}'")
+    return paths
+
+
 if __name__ == "__main__":
     PRESENTATION_ID = "1DHp7nE_loMyVXuE1i0FA3gW8DGkyZs-s1JFbqI_fttc"
 
@@ -0,0 +1,98 @@
+import re
+from dataclasses import replace
+import numpy as np
+from .presentation_model import Content
+from .summarizer import split_sections
+
+# Candidate images attached to every source section
+IMAGES_PER_SECTION = 2
+# Cosine similarity below this is not a match
+MIN_SCORE = 0.05
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it", "its",
+    "of", "on", "or", "that", "the", "their", "this", "to", "was", "were", "which", "with", "image", "shows",
+    "displays", "depicts",
+}
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS and len(token) > 1]
+
+
+class ImageIndex:
+    # TF-IDF vectors of image captions; sections are scored by cosine similarity.
+    # The vocabulary and IDF come from captions and sections together, so terms
+    # frequent across the whole paper weigh less.
+    def __init__(self, images, sections=()):
+        self.images = list(images)
+
+        docs = [tokenize(image.caption) for image in self.images]
+        corpus = docs + [tokenize(section) for section in sections]
+
+        self.vocabulary = {}
+        for tokens in corpus:
+            for token in tokens:
+                self.vocabulary.setdefault(token, len(self.vocabulary))
+
+        df = np.zeros(len(self.vocabulary))
+        for tokens in corpus:
+            df[[self.vocabulary[token] for token in set(tokens)]] += 1
+        self.idf = np.log((1 + len(corpus)) / (1 + df)) + 1
+
+        self.matrix = np.vstack([self._vector(tokens) for tokens in docs]) if docs else np.zeros((0, len(df)))
+
+    def _vector(self, tokens):
+        vector = np.zeros(len(self.vocabulary))
+        for token in tokens:
+            index = self.vocabulary.get(token)
+            if index is not None:
+                vector[index] += 1
+
+        vector *= self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def scores(self, text):
+        return self.matrix @ self._vector(tokenize(text))
+
+    def query(self, text, k=IMAGES_PER_SECTION, min_score=MIN_SCORE):
+        # [(score, image)], best first
+        if not self.images:
+            return []
+
+        scores = self.scores(text)
+        best = np.argsort(-scores, kind="stable")[:k]
+        return [(float(scores[i]), self.images[i]) for i in best if scores[i] >= min_score]
+
+
+def preselect_images(deps: Content, k=IMAGES_PER_SECTION, min_score=MIN_SCORE) -> Content:
+    # Deps with the top-k images attached to each section of the content, and only
+    # those images left in the prompt's image list
+    if len(deps.images) <= k:
+        return deps
+
+    sections = split_sections(deps.content)
+    index = ImageIndex(deps.images, sections)
+
+    selected = {}
+    annotated = []
+    for section in sections:
+        matches = index.query(section, k, min_score)
+        for _, image in matches:
+            selected.setdefault(image.image_url, image)
+
+        if matches:
+            urls = ", ".join(image.image_url for _, image in matches)
+            section = f"{section}\n[Candidate images: {urls}]"
+        annotated.append(section)
+
+    if not selected:
+        # Nothing scored (e.g. captions in another language): let the model choose from all of them
+        print(f"No image matched any of {len(sections)} sections, keeping all {len(deps.images)}")
+        return deps
+
+    print(f"Preselected {len(selected)} of {len(deps.images)} images for {len(sections)} sections")
+    return replace(deps, content="\n-----\n".join(annotated), images=list(selected.values()))
@@ -1,60 +1,495 @@
-from PIL import Image
+from PIL import Image, ImageOps
 from google import genai
 import boto3
+from boto3.s3.transfer import S3Transfer, TransferConfig, TransferManager
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import io
 import json
+import math
+import mimetypes
 import os
-from dotenv import load_env
+import threading
+from dotenv import load_dotenv
+from .caption_cache import caption_key, get_caption_cache
+from .metrics import METRICS
+from .presentation_model import ImageCaption, ImageData
+from .presentation_snapshot import iter_page_elements
+from .util import Slots
 
-load_env()
+load_dotenv()
 
-client = genai.Client(api_key=os.environ["GEMINI_API_KEY"])
 BUCKET_NAME = 'slide-gen-images-bucket'
+CAPTION_MODEL = "gemini-2.0-flash"
+CAPTION_PROMPT = "Describe content of image neatly"
 
-s3_client = boto3.client('s3')
-
-# Create bucket if not exists
-response = s3_client.create_bucket(
-    Bucket = BUCKET_NAME
+CAPTION_BATCH_PROMPT = (
+    f"{CAPTION_PROMPT}. Every image is preceded by its id. Answer with one caption "
+    "per image, as a list of {image_id, caption}."
 )
 
-s3_client.put_public_access_block(
-    Bucket=BUCKET_NAME,
-    PublicAccessBlockConfiguration={
-        'BlockPublicAcls': False,
-        'IgnorePublicAcls': False,
-        'BlockPublicPolicy': False,
-        'RestrictPublicBuckets': False,
-    },
-)
+# Batched captioning: images of one request must fit in the input budget, and their
+# captions (about CAPTION_OUTPUT_TOKENS each) in the model's output limit
+CAPTION_BATCH_INPUT_TOKENS = 64000
+CAPTION_BATCH_OUTPUT_TOKENS = 8192
+CAPTION_OUTPUT_TOKENS = 400
+CAPTION_BATCH_MAX_IMAGES = 16
 
-# Create a bucket policy
-bucket_policy = {
-    'Version': '2012-10-17',
-    'Statement': [{
-        'Sid': 'PublicAccessBucket',
-        'Effect': 'Allow',
-        'Principal': '*',
-        'Action': ['s3:GetObject', 's3:PutBucketPolicy'],
-        'Resource': [
-            f'arn:aws:s3:::{BUCKET_NAME}/*',
-            f'arn:aws:s3:::{BUCKET_NAME}'
-        ]
-    }]
-}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"}
+CAPTION_WORKERS = 4
+UPLOAD_WORKERS = 8
+TRANSFER_CONFIG = TransferConfig(max_concurrency=UPLOAD_WORKERS)
+
+# Nothing on a 16:9 slide is drawn larger than the full page at 1080p
+MAX_IMAGE_SIZE = (1920, 1080)
+JPEG_QUALITY = 85
+WEBP_QUALITY = 85
+
+# A marker file per bucket remembers that provisioning already ran, across processes
+BUCKET_MARKER_DIR = os.path.join(".cache", "s3")
+
+_clients_lock = threading.Lock()
+_genai_client = None
+_s3_client = None
+_s3_transfer_manager = None
+_s3_transfer = None
+
+# Process-wide caps on concurrent Gemini and S3 calls, shared by every ingest in
+# the process (several jobs of a batch run); see set_concurrency()
+_gemini_slots = Slots(CAPTION_WORKERS)
+_s3_slots = Slots(UPLOAD_WORKERS)
+
+_provision_lock = threading.Lock()
+_provisioned_buckets = set()
+
+# Object keys known to exist, per bucket. Only what this process uploaded or saw with a
+# HEAD request: a manifest kept across runs goes stale when the bucket changes behind
+# its back (lifecycle rules, manual deletes) and then hands out URLs of missing objects.
+_known_keys_lock = threading.Lock()
+_known_keys = set()
+
+
+def set_concurrency(gemini=None, s3=None):
+    global _gemini_slots, _s3_slots
+
+    if gemini is not None:
+        _gemini_slots = Slots(gemini)
+    if s3 is not None:
+        _s3_slots = Slots(s3)
+
+
+def gemini_slots():
+    # The process-wide Gemini limit; coroutines (summaries, agent runs) share it with
+    # the captioning threads through `async with`
+    return _gemini_slots
+
+
+def get_genai_client():
+    global _genai_client
+
+    with _clients_lock:
+        if _genai_client is None:
+            _genai_client = genai.Client(api_key=os.environ["GEMINI_API_KEY"])
+
+        return _genai_client
+
+
+def get_s3_client():
+    # boto3 clients are thread-safe, one is shared by every upload
+    global _s3_client
+
+    with _clients_lock:
+        if _s3_client is None:
+            _s3_client = boto3.client('s3')
+
+        return _s3_client
+
+
+def get_s3_transfer_manager():
+    # One transfer manager on the shared client, so file and buffer uploads alike reuse
+    # its thread pool and connection pool
+    global _s3_transfer_manager
+
+    s3_client = get_s3_client()
+    with _clients_lock:
+        if _s3_transfer_manager is None:
+            _s3_transfer_manager = TransferManager(s3_client, TRANSFER_CONFIG)
+
+        return _s3_transfer_manager
+
+
+def get_s3_transfer():
+    global _s3_transfer
+
+    manager = get_s3_transfer_manager()
+    with _clients_lock:
+        if _s3_transfer is None:
+            _s3_transfer = S3Transfer(manager=manager)
+
+        return _s3_transfer
+
+
+def provision_bucket(bucket_name=BUCKET_NAME):
+    s3_client = get_s3_client()
+
+    # Create bucket if not exists
+    try:
+        s3_client.create_bucket(
+            Bucket = bucket_name
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'BucketAlreadyOwnedByYou':
+            raise
+
+    s3_client.put_public_access_block(
+        Bucket=bucket_name,
+        PublicAccessBlockConfiguration={
+            'BlockPublicAcls': False,
+            'IgnorePublicAcls': False,
+            'BlockPublicPolicy': False,
+            'RestrictPublicBuckets': False,
+        },
+    )
+
+    # Create a bucket policy
+    bucket_policy = {
+        'Version': '2012-10-17',
+        'Statement': [{
+            'Sid': 'PublicAccessBucket',
+            'Effect': 'Allow',
+            'Principal': '*',
+            'Action': ['s3:GetObject', 's3:PutBucketPolicy'],
+            'Resource': [
+                f'arn:aws:s3:::{bucket_name}/*',
+                f'arn:aws:s3:::{bucket_name}'
+            ]
+        }]
+    }
+
+    # Convert the policy from JSON dict to string
+    bucket_policy = json.dumps(bucket_policy)
+
+    # Set the new policy
+    s3_client.put_bucket_policy(Bucket=bucket_name, Policy=bucket_policy)
+
+
+def ensure_bucket(bucket_name=BUCKET_NAME):
+    # Provision on first use only; later calls in this process cost nothing and
+    # later processes skip the AWS calls thanks to the marker file.
+    if bucket_name in _provisioned_buckets:
+        return
+
+    with _provision_lock:
+        if bucket_name in _provisioned_buckets:
+            return
+
+        marker = os.path.join(BUCKET_MARKER_DIR, f"{bucket_name}.provisioned")
+        if not os.path.exists(marker):
+            provision_bucket(bucket_name)
+
+            os.makedirs(BUCKET_MARKER_DIR, exist_ok=True)
+            with open(marker, "w") as f:
+                f.write(bucket_name)
+
+        _provisioned_buckets.add(bucket_name)
+
+
+def caption_image(image):
+    with _gemini_slots, METRICS.timed("gemini.caption"):
+        response = get_genai_client().models.generate_content(
+            model=CAPTION_MODEL,
+            contents=[CAPTION_PROMPT, image]
+        )
+
+    return response.text
+
+
+def probe_image(image_path):
+    # (width, height, format) from the file header; Image.open doesn't decode pixels until asked
+    with Image.open(image_path) as image:
+        return image.width, image.height, image.format
+
+
+def describe_image(image_path, cache=None):
+    # (width, height, caption). Identical bytes captioned before, with the same prompt
+    # and model, come from the caption cache without decoding the image at all.
+    cache = cache if cache is not None else get_caption_cache()
+
+    with open(image_path, "rb") as f:
+        key = caption_key(f.read(), CAPTION_PROMPT, CAPTION_MODEL)
+
+    cached = cache.get(key)
+    if cached is not None:
+        caption, width, height = cached
+        return width, height, caption
+
+    # Pixels are only needed for the model call, and released right after it
+    with Image.open(image_path) as image:
+        width, height = image.size
+        caption = caption_image(image)
+
+    cache.put(key, caption, width, height)
+    return width, height, caption
+
+
+def content_key(image_path=None, data=None, ext=None):
+    # image/<sha256 of the bytes><ext>: identical files share one object, and
+    # different files with the same name no longer overwrite each other
+    h = hashlib.sha256()
+    if data is not None:
+        h.update(data)
+    else:
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+
+    if ext is None:
+        ext = os.path.splitext(image_path)[1].lower()
+
+    return f"image/{h.hexdigest()}{ext}"
+
+
+def object_url(key, bucket_name=BUCKET_NAME):
+    return f"https://{bucket_name}.s3.amazonaws.com/{key}"
+
+
+def _remember_key(bucket_name, key):
+    with _known_keys_lock:
+        _known_keys.add((bucket_name, key))
+
+
+def object_exists(key, bucket_name=BUCKET_NAME):
+    # Keys seen in this process first, then a HEAD request
+    with _known_keys_lock:
+        if (bucket_name, key) in _known_keys:
+            return True
+
+    try:
+        with _s3_slots, METRICS.timed("s3.head"):
+            get_s3_client().head_object(Bucket=bucket_name, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
+    _remember_key(bucket_name, key)
+    return True
+
+
+def placeholder_pixel_size(presentation, max_size=MAX_IMAGE_SIZE):
+    # Largest image placeholder of a (template) presentation, in pixels of a
+    # `max_size` rendering of the page. Sizes in the API are EMU, scaled by the transform.
+    page_width = presentation["pageSize"]["width"]["magnitude"]
+    px_per_emu = max_size[0] / page_width
+    width, height = 0, 0
+
+    for slide in presentation.get("slides", []):
+        for element in iter_page_elements(slide.get("pageElements", [])):
+            if "image" not in element:
+                continue
+
+            transform = element.get("transform", {})
+            size = element.get("size", {})
+            w = size.get("width", {}).get("magnitude", 0) * abs(transform.get("scaleX", 1)) * px_per_emu
+            h = size.get("height", {}).get("magnitude", 0) * abs(transform.get("scaleY", 1)) * px_per_emu
+            width, height = max(width, w), max(height, h)
+
+    if not width or not height:
+        return max_size
+
+    return min(round(width), max_size[0]), min(round(height), max_size[1])
 
-# Convert the policy from JSON dict to string
-bucket_policy = json.dumps(bucket_policy)
 
-# Set the new policy
-s3_client.put_bucket_policy(Bucket=BUCKET_NAME, Policy=bucket_policy)
+def prepare_image(image_path, max_size=MAX_IMAGE_SIZE):
+    # Downscale to fit `max_size` and re-encode without metadata (EXIF, ICC, text chunks).
+    # Returns (bytes, content type, extension, (width, height)); animated images are sent
+    # as they are.
+    with Image.open(image_path) as image:
+        fmt = image.format
+        if getattr(image, "is_animated", False):
+            with open(image_path, "rb") as f:
+                data = f.read()
+            return data, Image.MIME.get(fmt, "application/octet-stream"), os.path.splitext(image_path)[1].lower(), image.size
+
+        # Bake the EXIF orientation in, since the tag itself is dropped
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(max_size, Image.LANCZOS)
+
+        out = io.BytesIO()
+        if fmt == "JPEG":
+            image.convert("RGB").save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            ext = ".jpg"
+        elif fmt == "WEBP":
+            image.save(out, "WEBP", quality=WEBP_QUALITY, method=6)
+            ext = ".webp"
+        else:
+            # Figures and plots: lossless
+            fmt = "PNG"
+            image.save(out, "PNG", optimize=True)
+            ext = ".png"
+
+    return out.getvalue(), Image.MIME[fmt], ext, image.size
+
+
+def estimate_image_tokens(width, height):
+    # Gemini 2.0 bills small images as one 258-token tile; larger ones are cut into
+    # tiles of min(width, height) / 1.5, clamped to 256..768 px
+    if width <= 384 and height <= 384:
+        return 258
+
+    tile = min(max(min(width, height) / 1.5, 256), 768)
+    return math.ceil(width / tile) * math.ceil(height / tile) * 258
+
+
+def plan_caption_batches(image_paths, input_tokens=CAPTION_BATCH_INPUT_TOKENS,
+                         output_tokens=CAPTION_BATCH_OUTPUT_TOKENS, max_images=CAPTION_BATCH_MAX_IMAGES):
+    # Group images, in order, into batches that stay within the token budgets.
+    # Files that can't be read as images are left out.
+    max_images = min(max_images, max(1, output_tokens // CAPTION_OUTPUT_TOKENS))
+    batches, batch, used = [], [], 0
+
+    for path in image_paths:
+        try:
+            width, height, _ = probe_image(path)
+        except Exception as e:
+            print(f"Skipping '{path}', not a readable image: {e}")
+            continue
+
+        tokens = estimate_image_tokens(width, height)
+
+        if batch and (used + tokens > input_tokens or len(batch) >= max_images):
+            batches.append(batch)
+            batch, used = [], 0
+
+        batch.append(path)
+        used += tokens
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+def caption_images(images):
+    # One structured-output request for several (image_id, image) pairs -> {image_id: caption}
+    contents = [CAPTION_BATCH_PROMPT]
+    for image_id, image in images:
+        contents += [f"Image {image_id}:", image]
+
+    with _gemini_slots, METRICS.timed("gemini.caption_batch"):
+        response = get_genai_client().models.generate_content(
+            model=CAPTION_MODEL,
+            contents=contents,
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": list[ImageCaption],
+                "max_output_tokens": CAPTION_BATCH_OUTPUT_TOKENS,
+            },
+        )
+
+    ids = {image_id for image_id, _ in images}
+    return {item.image_id: item.caption for item in response.parsed or [] if item.image_id in ids}
+
+
+def describe_images(image_paths, cache=None):
+    # describe_image() for a batch: cache misses are captioned in one request, and
+    # images the batch didn't answer for fall back to one request each.
+    # Returns {path: (width, height, caption)}; images that failed are left out.
+    cache = cache if cache is not None else get_caption_cache()
+    results, misses = {}, []
+
+    for path in image_paths:
+        with open(path, "rb") as f:
+            key = caption_key(f.read(), CAPTION_PROMPT, CAPTION_MODEL)
+
+        cached = cache.get(key)
+        if cached is not None:
+            caption, width, height = cached
+            results[path] = (width, height, caption)
+        else:
+            misses.append((path, key))
+
+    if len(misses) > 1:
+        captions = {}
+        images = []
+        try:
+            for path, _ in misses:
+                images.append(Image.open(path))
+
+            captions = caption_images([(f"img_{i}", image) for i, image in enumerate(images)])
+        except Exception as e:
+            print(f"Batched captioning of {len(misses)} images failed, captioning one by one: {e}")
+        finally:
+            for image in images:
+                image.close()
+
+        for i, (path, key) in enumerate(misses):
+            caption = captions.get(f"img_{i}")
+            if caption:
+                width, height, _ = probe_image(path)
+                cache.put(key, caption, width, height)
+                results[path] = (width, height, caption)
+
+    for path, _ in misses:
+        if path not in results:
+            try:
+                results[path] = describe_image(path, cache)
+            except Exception as e:
+                print(f"Failed to describe '{path}': {e}")
+
+    return results
+
+
+def upload_image(image_path, max_size=None):
+    # (url, (width, height)) of the uploaded object. With `max_size`, the image goes
+    # through prepare_image() first, so the size is the one of the downscaled copy.
+    ensure_bucket()
+
+    if max_size is not None:
+        data, content_type, ext, size = prepare_image(image_path, max_size)
+        key = content_key(data=data, ext=ext)
+    else:
+        data = None
+        content_type = mimetypes.guess_type(image_path)[0] or "application/octet-stream"
+        key = content_key(image_path)
+        size = probe_image(image_path)[:2]
+
+    if object_exists(key):
+        return object_url(key), size
+
+    # Set content type and make public.
+    if data is not None:
+        with _s3_slots, METRICS.timed("s3.upload", payload_bytes=len(data)):
+            get_s3_transfer_manager().upload(
+                io.BytesIO(data),
+                BUCKET_NAME,
+                key,
+                extra_args = {
+                    'ContentType': content_type,
+                }
+            ).result()
+    else:
+        with _s3_slots, METRICS.timed("s3.upload", payload_bytes=os.path.getsize(image_path)):
+            get_s3_transfer().upload_file(
+                image_path,
+                BUCKET_NAME,
+                key,
+                extra_args = {
+                    'ContentType': content_type,
+                }
+            )
+
+    _remember_key(BUCKET_NAME, key)
+    return object_url(key), size
+
 
 class ImageResource:
     def __init__(self, image_path, caption=None):
         # Path to local image
         self.image_path = image_path
-        self.image = self.get_image()
-        self.width, self.height = self.image.size
+        # Only the header is read here, pixels are decoded when captioning needs them
+        self.width, self.height, self.format = probe_image(image_path)
 
         if caption is not None:
             self.caption = caption
@@ -64,6 +499,7 @@ class ImageResource:
         self.image_url = self.upload_image_to_s3()
 
     def get_image(self):
+        # A fresh, lazily decoded image; the caller closes it
         try:
             img = Image.open(self.image_path)
             return img
@@ -74,28 +510,12 @@ class ImageResource:
             return f"An error occurred: {e}"
 
     def get_caption(self):
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=["Describe content of image neatly", self.image]
-        )
-
-        return response.text
-
-    def upload_image_to_s3(self, acl="public-read"):
-        # Upload the file
-        s3_client = boto3.client('s3')
+        _, _, caption = describe_image(self.image_path)
+        return caption
 
+    def upload_image_to_s3(self, acl="public-read", max_size=None):
         try:
-            s3_client.upload_file(
-                self.image_path,
-                BUCKET_NAME,
-                self.image_path,
-                ExtraArgs = {
-                    'ContentType': 'image/jpeg',
-                }
-            )  # Set content type and make public.
-
-            url = f"https://{BUCKET_NAME}.s3.amazonaws.com/{self.image_path}"
+            url, (self.width, self.height) = upload_image(self.image_path, max_size)
             print(f"File uploaded successfully. URL: {url}")
 
             return url
@@ -103,11 +523,110 @@ class ImageResource:
         except Exception as e:
             print(e)
 
+    def to_image_data(self):
+        return ImageData(image_url=self.image_url, caption=self.caption, width=self.width, height=self.height)
+
+
+def iter_image_paths(source):
+    # A directory (its image files, sorted) or any iterable of paths
+    if isinstance(source, (str, os.PathLike)) and os.path.isdir(source):
+        return [
+            os.path.join(source, name) for name in sorted(os.listdir(source))
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+        ]
+
+    return list(source)
+
+
+def _describe(image_path, caption=None):
+    if caption is None:
+        return describe_image(image_path)
+
+    width, height, _ = probe_image(image_path)
+    return width, height, caption
+
+
+def ingest_images(source, captions=None, caption_workers=CAPTION_WORKERS, upload_workers=UPLOAD_WORKERS,
+                  max_size=MAX_IMAGE_SIZE, batch_captions=True, presentation=None):
+    # Caption and upload a batch of images, overlapping the two on separate bounded
+    # pools, and yield an ImageData as soon as both parts of an image are done
+    # (completion order). `captions` maps paths to known captions; images are
+    # downscaled to `max_size` before upload (None uploads the originals), or to the
+    # largest image placeholder of the template `presentation` when one is given.
+    # With `batch_captions`, several images share one captioning request.
+    captions = captions or {}
+    if presentation is not None and max_size is not None:
+        max_size = placeholder_pixel_size(presentation, max_size)
+        print(f"Downscaling images to fit {max_size[0]}x{max_size[1]}")
+
+    paths = iter_image_paths(source)
+    pending = [path for path in paths if path not in captions]
+    parts = {}
+
+    if batch_captions:
+        batches = plan_caption_batches(pending)
+
+        # Unreadable files were left out of the batches; don't upload them either
+        planned = {path for batch in batches for path in batch}
+        paths = [path for path in paths if path in captions or path in planned]
+    else:
+        batches = [[path] for path in pending]
+
+    with ThreadPoolExecutor(max_workers=caption_workers) as caption_pool, \
+            ThreadPoolExecutor(max_workers=upload_workers) as upload_pool:
+        futures = {}
+        for batch in batches:
+            futures[caption_pool.submit(describe_images, batch)] = (batch, "describe")
+        for path in paths:
+            if path in captions:
+                futures[caption_pool.submit(_describe, path, captions[path])] = ([path], "describe")
+            futures[upload_pool.submit(upload_image, path, max_size)] = ([path], "upload")
+
+        for future in as_completed(futures):
+            batch, part = futures[future]
+
+            try:
+                result = future.result()
+            except Exception as e:
+                for path in batch:
+                    print(f"Failed to {part} '{path}': {e}")
+                    parts[path] = None
+                continue
+
+            if part == "describe":
+                if not isinstance(result, dict):
+                    result = {batch[0]: result}
+                finished = result.items()
+
+                # Left out of the batch result: captioning that image failed
+                for path in batch:
+                    if path not in result:
+                        parts[path] = None
+            else:
+                finished = [(batch[0], result)]
+
+            for path, value in finished:
+                if path in parts and parts[path] is None:
+                    continue
+
+                done = parts.setdefault(path, {})
+                done[part] = value
+
+                if len(done) == 2:
+                    # The size of what was uploaded: that's the image Slides fetches
+                    _, _, caption = done["describe"]
+                    image_url, (width, height) = done["upload"]
+                    yield ImageData(image_url=image_url, caption=caption, width=width, height=height)
+
+    cache = get_caption_cache()
+    cache.evict()
+    print(f"Caption cache: {cache.stats()}")
+
 
 if __name__ == "__main__":
     images = []
     IMG_DIR = "image"
 
-    for img_path in os.listdir(IMG_DIR):
-        img = ImageResource(image_path = f'{IMG_DIR}/{img_path}')
-        images.append(img)
\ No newline at end of file
+    for image in ingest_images(IMG_DIR):
+        print(f"{image.image_url}: {image.caption}")
+        images.append(image)
@@ -0,0 +1,200 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is +Inf
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class StageMetrics:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.seconds = 0.0
+        self.payload_bytes = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "retries": self.retries,
+            "seconds": self.seconds,
+            "payload_bytes": self.payload_bytes,
+            "buckets": list(self.buckets),
+        }
+
+
+# Metrics of the current run (e.g. one chat message), see start_run_metrics()
+_run_metrics = ContextVar("run_metrics", default=None)
+
+
+class Metrics:
+    # Counters and latency histograms per pipeline stage
+    # (e.g. "slides.batch_update", "agent.run", "s3.upload").
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def _stage(self, stage):
+        if stage not in self.stages:
+            self.stages[stage] = StageMetrics()
+
+        return self.stages[stage]
+
+    def _targets(self):
+        # Whatever is recorded process-wide also goes to the run in progress
+        yield self
+        run_metrics = _run_metrics.get()
+        if run_metrics is not None and run_metrics is not self:
+            yield run_metrics
+
+    def observe(self, stage, seconds, payload_bytes=0, error=False):
+        for target in self._targets():
+            with target.lock:
+                metrics = target._stage(stage)
+                metrics.count += 1
+                metrics.errors += int(error)
+                metrics.seconds += seconds
+                metrics.payload_bytes += payload_bytes
+                metrics.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def record_retry(self, stage):
+        for target in self._targets():
+            with target.lock:
+                target._stage(stage).retries += 1
+
+    def record_payload(self, stage, payload_bytes):
+        for target in self._targets():
+            with target.lock:
+                target._stage(stage).payload_bytes += payload_bytes
+
+    @contextmanager
+    def timed(self, stage, payload_bytes=0):
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start, payload_bytes, error)
+
+    def snapshot(self):
+        with self.lock:
+            return {stage: metrics.as_dict() for stage, metrics in self.stages.items()}
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+
+    def to_prometheus(self):
+        lines = []
+        stages = self.snapshot()
+
+        for name, key, kind in [("slide_gen_stage_calls_total", "count", "counter"),
+                                ("slide_gen_stage_errors_total", "errors", "counter"),
+                                ("slide_gen_stage_retries_total", "retries", "counter"),
+                                ("slide_gen_stage_payload_bytes_total", "payload_bytes", "counter")]:
+            lines.append(f"# TYPE {name} {kind}")
+            for stage, metrics in stages.items():
+                lines.append(f'{name}{{stage="{stage}"}} {metrics[key]}')
+
+        name = "slide_gen_stage_latency_seconds"
+        lines.append(f"# TYPE {name} histogram")
+        for stage, metrics in stages.items():
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS + ("+Inf",), metrics["buckets"]):
+                cumulative += n
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {metrics["seconds"]}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {metrics["count"]}')
+
+        return "\n".join(lines) + "\n"
+
+    def write_json_lines(self, path, **labels):
+        # One line per stage, e.g. labels=dict(run_id=..., presentation_id=...)
+        now = time.time()
+        with open(path, "a", encoding="utf-8") as f:
+            for stage, metrics in self.snapshot().items():
+                f.write(json.dumps({"time": now, **labels, "stage": stage, **metrics}) + "\n")
+
+
+def diff_snapshots(before, after):
+    # Per-stage activity between two `Metrics.snapshot()` calls
+    result = {}
+    for stage, metrics in after.items():
+        prev = before.get(stage)
+        if prev is None:
+            result[stage] = metrics
+            continue
+
+        delta = {key: metrics[key] - prev[key] for key in ("count", "errors", "retries", "seconds", "payload_bytes")}
+        delta["buckets"] = [a - b for a, b in zip(metrics["buckets"], prev["buckets"])]
+        if delta["count"] or delta["retries"]:
+            result[stage] = delta
+
+    return result
+
+
+def summarize(stages):
+    # Short text for a UI label, e.g. "3 calls, 1 retry"
+    calls = sum(metrics["count"] for metrics in stages.values())
+    retries = sum(metrics["retries"] for metrics in stages.values())
+
+    text = f"{calls} call{'s' if calls != 1 else ''}"
+    if retries:
+        text += f", {retries} retr{'ies' if retries != 1 else 'y'}"
+
+    return text
+
+
+def start_run_metrics():
+    # Collect a separate copy of everything recorded from this context on (and the
+    # tasks/threads it starts). Each Chainlit message runs in its own context.
+    run_metrics = Metrics()
+    _run_metrics.set(run_metrics)
+
+    return run_metrics
+
+
+METRICS = Metrics()
+
+# Port of the Prometheus endpoint, separate from the UI so no catch-all route shadows it
+# Loopback only by default: the endpoint has no authentication
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9464
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    metrics = METRICS
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = self.metrics.to_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port=METRICS_PORT, host=METRICS_HOST, metrics=METRICS):
+    # Serve `metrics` at http://host:port/metrics from a daemon thread; returns the server
+    handler = type("MetricsHandler", (_MetricsHandler,), {"metrics": metrics})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+
+    return server
@@ -2,12 +2,25 @@ from pydantic import BaseModel, Field
 from dataclasses import dataclass
 from typing import List, Union, Literal, Optional
 
+# Slide layouts of the template presentation, in template order
+TEMPLATE_LAYOUTS = ["cover", "table content", "only text", "text, image 25%", "text and image equal, 50%-50%",
+                    "image, text 25%", "only image", "text and 4 images", "text and 2 images", "graph", "video",
+                    "closing"]
+
 class ImageData(BaseModel):
     image_url: str
     caption: str
     width: int
     height: int
 
+class ImageCaption(BaseModel):
+    image_id: str
+    caption: str
+
+class SectionSummary(BaseModel):
+    heading: str
+    points: List[str]
+
 @dataclass
 class Content:
     title: str
@@ -0,0 +1,185 @@
+import copy
+import json
+from .google_slide_auth import get_slides_service
+from .metrics import METRICS
+from .util import call_api_decorator, SLIDES_READ_LIMITER, SLIDES_WRITE_LIMITER
+
+# Requests that only touch text inside existing shapes. They never change the
+# object tree (slide ids, element ids, sizes, transforms) that SlideOps reads.
+TEXT_ONLY_REQUESTS = {
+    "insertText",
+    "deleteText",
+    "createParagraphBullets",
+    "deleteParagraphBullets",
+    "updateTextStyle",
+    "updateParagraphStyle",
+    "replaceAllText",
+}
+
+
+def iter_page_elements(elements):
+    # Page elements including the children of grouped elements
+    for element in elements:
+        yield element
+        yield from iter_page_elements(element.get("elementGroup", {}).get("children", []))
+
+
+class PresentationSnapshot:
+    def __init__(self, presentation_id, service=None):
+        if service is None:
+            service = get_slides_service()
+
+        self.presentation_id = presentation_id
+        self.service = service
+        self._presentation = None
+
+    @property
+    def presentation(self):
+        if self._presentation is None:
+            self.refresh()
+
+        return self._presentation
+
+    @property
+    def slides(self):
+        return self.presentation.get("slides", [])
+
+    @property
+    def is_stale(self):
+        return self._presentation is None
+
+    @call_api_decorator(limiter=SLIDES_READ_LIMITER, stage="slides.get")
+    def refresh(self):
+        self._presentation = (
+            self.service.presentations().get(presentationId = self.presentation_id).execute()
+        )
+
+        return self._presentation
+
+    def invalidate(self):
+        self._presentation = None
+
+    @call_api_decorator(limiter=SLIDES_WRITE_LIMITER, stage="slides.batch_update", idempotent=False)
+    def batch_update(self, requests):
+        body = {"requests": requests}
+        METRICS.record_payload("slides.batch_update", len(json.dumps(body)))
+        response = self.service.presentations().batchUpdate(
+            presentationId = self.presentation_id, body=body
+        ).execute()
+        self.apply_replies(requests, response)
+
+        return response
+
+    def slide_index(self, slide_id):
+        for idx, slide in enumerate(self.slides):
+            if slide.get("objectId") == slide_id:
+                return idx
+
+        return None
+
+    def get_slide(self, slide_id):
+        idx = self.slide_index(slide_id)
+        if idx is None:
+            raise KeyError(f"Slide '{slide_id}' not found in presentation {self.presentation_id}")
+
+        return self.slides[idx]
+
+    def apply_replies(self, requests, response):
+        # Replay a successful batchUpdate on the local copy. Anything that cannot
+        # be mirrored exactly drops the snapshot so the next read refetches it.
+        if self._presentation is None:
+            return
+
+        replies = (response or {}).get("replies", [])
+
+        for i, request in enumerate(requests):
+            reply = replies[i] if i < len(replies) else {}
+            if not self._apply_request(request, reply):
+                self.invalidate()
+                return
+
+    def _apply_request(self, request, reply):
+        kind, params = next(iter(request.items()))
+
+        if kind in TEXT_ONLY_REQUESTS:
+            return True
+        if kind == "deleteObject":
+            return self._apply_delete(params["objectId"])
+        if kind == "duplicateObject":
+            new_id = reply.get("duplicateObject", {}).get("objectId")
+            return self._apply_duplicate(params["objectId"], new_id, params.get("objectIds", {}))
+        if kind == "updateSlidesPosition":
+            return self._apply_move(params["slideObjectIds"], params["insertionIndex"])
+        if kind == "createImage":
+            element = {
+                "objectId": params["objectId"],
+                "size": params["elementProperties"].get("size"),
+                "transform": params["elementProperties"].get("transform"),
+                "image": {"sourceUrl": params["url"]},
+            }
+            return self._apply_create(params["elementProperties"]["pageObjectId"], element)
+        if kind == "createTable":
+            element = {
+                "objectId": params["objectId"],
+                "table": {"rows": params["rows"], "columns": params["columns"]},
+            }
+            return self._apply_create(params["elementProperties"]["pageObjectId"], element)
+
+        return False
+
+    def _apply_delete(self, object_id):
+        slides = self._presentation.get("slides", [])
+
+        idx = self.slide_index(object_id)
+        if idx is not None:
+            slides.pop(idx)
+            return True
+
+        for slide in slides:
+            elements = slide.get("pageElements", [])
+            for j, element in enumerate(elements):
+                if element.get("objectId") == object_id:
+                    elements.pop(j)
+                    return True
+
+        return False
+
+    def _apply_duplicate(self, object_id, new_id, object_ids):
+        idx = self.slide_index(object_id)
+        if idx is None or new_id is None:
+            return False
+
+        duplicate = copy.deepcopy(self.slides[idx])
+        duplicate["objectId"] = new_id
+
+        # Element ids of the copy are only known when the request assigned them.
+        for element in iter_page_elements(duplicate.get("pageElements", [])):
+            if element.get("objectId") not in object_ids:
+                return False
+            element["objectId"] = object_ids[element["objectId"]]
+
+        self._presentation["slides"].insert(idx + 1, duplicate)
+        return True
+
+    def _apply_move(self, slide_ids, insertion_index):
+        slides = self._presentation.get("slides", [])
+        positions = [self.slide_index(slide_id) for slide_id in slide_ids]
+        if None in positions:
+            return False
+
+        # insertionIndex refers to the arrangement before the move
+        insertion_index -= sum(1 for pos in positions if pos < insertion_index)
+        moved = [slides[pos] for pos in positions]
+        for pos in sorted(positions, reverse=True):
+            slides.pop(pos)
+
+        slides[insertion_index:insertion_index] = moved
+        return True
+
+    def _apply_create(self, page_id, element):
+        idx = self.slide_index(page_id)
+        if idx is None:
+            return False
+
+        self.slides[idx].setdefault("pageElements", []).append(element)
+        return True
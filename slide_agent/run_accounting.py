@@ -0,0 +1,158 @@
+import json
+import os
+import sys
+import time
+import uuid
+
+# One JSON line per agent run
+RUNS_PATH = os.environ.get("SLIDE_GEN_RUNS_PATH", "runs.jsonl")
+
+# USD per million tokens (input, output)
+MODEL_PRICES = {
+    "google-gla:gemini-2.0-flash": (0.10, 0.40),
+    "google-gla:gemini-2.0-flash-lite": (0.075, 0.30),
+    "google-gla:gemini-1.5-flash": (0.075, 0.30),
+    "google-gla:gemini-1.5-pro": (1.25, 5.00),
+}
+
+# Rough size of a token, when the provider reports no usage (e.g. cached runs)
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_cost(model, input_tokens, output_tokens):
+    if model not in MODEL_PRICES:
+        return None
+
+    input_price, output_price = MODEL_PRICES[model]
+    return (input_tokens * input_price + output_tokens * output_price) / 1e6
+
+
+class RunAccount:
+    # Size, timing and cost of one agent run: call first_token() on the first
+    # streamed delta, bracket result handling (the CallToolsNode step, where the
+    # Presentation is validated) with begin/end_validation(), then finish(usage).
+    def __init__(self, model, system_prompt, cached=False, **labels):
+        self.run_id = uuid.uuid4().hex
+        self.model = model
+        self.cached = cached
+        self.labels = labels
+        self.prompt_chars = len(system_prompt)
+        self.prompt_tokens_estimate = estimate_tokens(system_prompt)
+
+        self.started = time.perf_counter()
+        self.time_to_first_token = None
+        self.validation_seconds = 0.0
+        self.validation_started = None
+        self.total_seconds = None
+        self.usage = None
+
+    def first_token(self):
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self.started
+
+    def begin_validation(self):
+        self.validation_started = time.perf_counter()
+
+    def end_validation(self):
+        if self.validation_started is not None:
+            self.validation_seconds += time.perf_counter() - self.validation_started
+            self.validation_started = None
+
+    def finish(self, usage=None):
+        # `usage` is pydantic-ai's Usage (request/response tokens of every model request)
+        self.end_validation()
+        self.total_seconds = time.perf_counter() - self.started
+        self.usage = usage
+        return self
+
+    def as_dict(self):
+        usage = self.usage
+        prompt_tokens = getattr(usage, "request_tokens", None)
+        output_tokens = getattr(usage, "response_tokens", None)
+        requests = getattr(usage, "requests", 0 if self.cached else None)
+
+        cost = None
+        if not self.cached:
+            cost = estimate_cost(
+                self.model,
+                prompt_tokens if prompt_tokens is not None else self.prompt_tokens_estimate,
+                output_tokens or 0,
+            )
+
+        total = self.total_seconds
+        return {
+            "time": time.time(),
+            "run_id": self.run_id,
+            **self.labels,
+            "model": self.model,
+            "cached": self.cached,
+            "requests": requests,
+            "prompt_chars": self.prompt_chars,
+            "prompt_tokens_estimate": self.prompt_tokens_estimate,
+            "prompt_tokens": prompt_tokens,
+            "output_tokens": output_tokens,
+            "time_to_first_token": self.time_to_first_token,
+            "total_seconds": total,
+            "validation_seconds": self.validation_seconds,
+            "validation_share": self.validation_seconds / total if total else None,
+            "cost_usd": cost,
+        }
+
+    def write_json_lines(self, path=RUNS_PATH):
+        record = self.as_dict()
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+        return record
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _group(record):
+    # Runs of one model at different stages (summaries, generation) are told apart
+    stage = record.get("stage")
+    return f"{record['model']} / {stage}" if stage else record["model"]
+
+
+def aggregate(path=RUNS_PATH):
+    # Per-model (and stage) totals and distributions of everything run_accounting recorded
+    summaries = {}
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    for group in sorted({_group(record) for record in records}):
+        runs = [record for record in records if _group(record) == group]
+        fresh = [record for record in runs if not record["cached"]]
+
+        summary = {
+            "runs": len(runs),
+            "cached": len(runs) - len(fresh),
+            "cost_usd": sum(record["cost_usd"] or 0 for record in fresh),
+        }
+        for key in ("prompt_chars", "prompt_tokens", "output_tokens", "time_to_first_token",
+                    "total_seconds", "validation_share"):
+            values = [record[key] for record in fresh if record.get(key) is not None]
+            summary[key] = {
+                "mean": sum(values) / len(values) if values else None,
+                "p50": _percentile(values, 0.5),
+                "p95": _percentile(values, 0.95),
+                "max": max(values) if values else None,
+            }
+
+        summaries[group] = summary
+
+    return summaries
+
+
+if __name__ == "__main__":
+    print(json.dumps(aggregate(sys.argv[1] if len(sys.argv) > 1 else RUNS_PATH), indent=2))
@@ -0,0 +1,45 @@
+import hashlib
+import json
+import os
+import threading
+from .sqlite_cache import SqliteCache
+
+RUN_CACHE_PATH = os.environ.get("SLIDE_GEN_RUN_CACHE", os.path.join(".cache", "agent_runs.sqlite3"))
+RUN_CACHE_TTL = 7 * 24 * 3600
+RUN_CACHE_MAX_ENTRIES = 1000
+
+
+def run_key(system_prompt, model_name, model_settings, result_schema=None, user_prompt=""):
+    # Everything that decides the output of a (temperature 0) run; a changed result
+    # model changes the schema, so old entries can't fail validation later
+    payload = {
+        "system_prompt": system_prompt,
+        "model": model_name,
+        "settings": model_settings or {},
+        "schema": result_schema,
+        "user_prompt": user_prompt,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class RunCache(SqliteCache):
+    # Validated agent results (JSON) keyed by run_key()
+    table = "runs"
+    columns = (("result", "TEXT"),)
+
+    def __init__(self, path=RUN_CACHE_PATH, ttl=RUN_CACHE_TTL, max_entries=RUN_CACHE_MAX_ENTRIES):
+        super().__init__(path, ttl, max_entries)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_run_cache():
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = RunCache()
+
+        return _cache
@@ -1,17 +1,31 @@
+import asyncio
 import os
+from contextlib import nullcontext
+from types import SimpleNamespace
 from pydantic_ai import Agent, RunContext
+from pydantic_ai.messages import PartDeltaEvent, PartStartEvent
 from typing import List, Union, Literal, Optional
 from .google_slide_ops import SlideOps
+from .presentation_snapshot import PresentationSnapshot, iter_page_elements
+from .slide_planner import new_object_id, plan_slide_moves, plan_template_restructure, chunk_requests
 from .presentation_model import Content, ImageData, Presentation, BulletPoints, Description
+from .run_cache import get_run_cache, run_key
+from .summarizer import condense_content_async
+from .image_index import preselect_images
+from .run_accounting import RunAccount
 from dotenv import load_dotenv
 
 load_dotenv()
 
+MODEL_NAME = 'google-gla:gemini-2.0-flash'
+
 slide_gen_agent = Agent(
-    'google-gla:gemini-2.0-flash',
+    MODEL_NAME,
     deps_type=Content,
     result_type=Presentation,
-    model_settings={"temperature": 0.0}
+    model_settings={"temperature": 0.0},
+    # Resolve the model (and its API key) on first run, so offline tools can import the pipeline
+    defer_model_check=True
 )
 
 @slide_gen_agent.system_prompt
@@ -37,7 +51,99 @@ def system_prompt(ctx: RunContext[Content]) -> str:
     Make sure content brevity BUT clarity and meaningful.
     """
 
-def delete_unnecessary_slide(presentation_id, target, curr_template):
+def render_system_prompt(deps):
+    return system_prompt(SimpleNamespace(deps=deps))
+
+
+def presentation_cache_key(deps, user_prompt=""):
+    # The rendered prompt covers everything of the deps the model sees (title, content, images)
+    prompt = render_system_prompt(deps)
+    return run_key(prompt, MODEL_NAME, slide_gen_agent.model_settings, Presentation.model_json_schema(), user_prompt)
+
+
+def get_cached_presentation(deps, cache=None):
+    cache = cache if cache is not None else get_run_cache()
+    result = cache.get(presentation_cache_key(deps))
+
+    if result is not None:
+        return Presentation.model_validate_json(result)
+
+
+def cache_presentation(deps, presentation, cache=None):
+    cache = cache if cache is not None else get_run_cache()
+    cache.put(presentation_cache_key(deps), presentation.model_dump_json())
+
+
+def _event_loop():
+    # The loop Agent.run_sync drives, so sync calls share one loop (and its clients)
+    try:
+        return asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        return loop
+
+
+def generate_presentation(deps, cache=None):
+    # Sync wrapper of generate_presentation_async(), for scripts; code that already
+    # runs in an event loop awaits that instead
+    return _event_loop().run_until_complete(generate_presentation_async(deps, cache))
+
+
+async def run_agent(deps, account, on_node=None, on_event=None):
+    # slide_gen_agent.run, node by node: model responses are streamed so `account` sees
+    # the first token, and the CallToolsNode step (where the Presentation is validated)
+    # is timed until the next node starts. `on_node(node)` sees every node and
+    # `on_event(event)` every streamed event, e.g. for stream.py to write slides early.
+    async with slide_gen_agent.iter("", deps=deps) as run:
+        async for node in run:
+            account.end_validation()
+            if on_node is not None:
+                on_node(node)
+
+            if Agent.is_model_request_node(node):
+                async with node.stream(run.ctx) as request_stream:
+                    async for event in request_stream:
+                        if isinstance(event, (PartStartEvent, PartDeltaEvent)):
+                            account.first_token()
+                        if on_event is not None:
+                            on_event(event)
+            elif Agent.is_call_tools_node(node):
+                account.begin_validation()
+                if on_event is not None:
+                    async with node.stream(run.ctx) as handle_stream:
+                        async for event in handle_stream:
+                            on_event(event)
+
+    account.finish(run.usage())
+    return run.result.data
+
+
+async def generate_presentation_async(deps, cache=None, gemini_slots=None, on_node=None, on_event=None,
+                                      **labels):
+    # slide_gen_agent.run, memoized: identical deps and settings reuse the last result.
+    # Long sources are condensed to an outline (see summarizer) and every section
+    # carries only its most relevant images (see image_index) before the run.
+    # `gemini_slots` caps concurrent Gemini calls, summaries and the run alike.
+    # The callbacks go to run_agent() (a cached result runs no node); `labels` to the run record.
+    presentation = get_cached_presentation(deps, cache)
+    if presentation is None:
+        run_deps = preselect_images(await condense_content_async(deps, cache=cache, gemini_slots=gemini_slots))
+        account = RunAccount(MODEL_NAME, render_system_prompt(run_deps), stage="generate", **labels)
+        async with gemini_slots or nullcontext():
+            presentation = await run_agent(run_deps, account, on_node, on_event)
+        cache_presentation(deps, presentation, cache)
+    else:
+        account = RunAccount(MODEL_NAME, render_system_prompt(deps), cached=True, stage="generate", **labels).finish()
+
+    account.write_json_lines()
+    return presentation
+
+
+def delete_unnecessary_slide(presentation_id, target, curr_template, snapshot=None):
+    if snapshot is None:
+        snapshot = PresentationSnapshot(presentation_id)
+
     slide_indexes = []
     for idx, curr in enumerate(curr_template):
         if curr not in target:
@@ -48,7 +154,7 @@ def delete_unnecessary_slide(presentation_id, target, curr_template):
 
     for idx in slide_indexes:
         print(f"### DELETE SLIDE #{idx}")
-        s = SlideOps(presentation_id, page=idx)
+        s = SlideOps(presentation_id, page=idx, snapshot=snapshot)
 
         requests += [
             {
@@ -60,13 +166,17 @@ def delete_unnecessary_slide(presentation_id, target, curr_template):
 
         curr_template.pop(idx)
 
-    response = s.call_batch_update(requests)
-    print(response)
+    if requests:
+        response = s.call_batch_update(requests)
+        print(response)
 
     return curr_template
 
 
-def copy_slide(presentation_id, target, curr_template):
+def copy_slide(presentation_id, target, curr_template, snapshot=None):
+    if snapshot is None:
+        snapshot = PresentationSnapshot(presentation_id)
+
     n_times = {}
     for temp in target:
         if temp in n_times.keys():
@@ -82,14 +192,24 @@ def copy_slide(presentation_id, target, curr_template):
 
         if n > 0:
             print(f"### COPY SLIDE #{slide_idx} {n} times")
-            s = SlideOps(presentation_id, page=slide_idx)
-            requests = [
-                           {
-                               "duplicateObject": {
-                                   "objectId": s.page_id,
-                               }
-                           }
-                       ] * n
+            s = SlideOps(presentation_id, page=slide_idx, snapshot=snapshot)
+
+            # Pre-assign the ids of each copy and its elements, so the snapshot can
+            # mirror the duplicates instead of refetching the deck
+            template = snapshot.get_slide(s.page_id)
+            for _ in range(n):
+                object_ids = {s.page_id: new_object_id()}
+                for element in iter_page_elements(template.get("pageElements", [])):
+                    object_ids[element["objectId"]] = new_object_id()
+
+                requests.append(
+                    {
+                        "duplicateObject": {
+                            "objectId": s.page_id,
+                            "objectIds": object_ids,
+                        }
+                    }
+                )
 
             response = s.call_batch_update(requests)
             print(response)
@@ -103,22 +223,84 @@ def copy_slide(presentation_id, target, curr_template):
 
     return curr_template
 
-def move_slide(presentation_id, target, curr_template):
-    for i, target_element in enumerate(target):
-        # Skip element from i and find position of element
-        current_idx = curr_template.index(target_element, i)
-        if current_idx != i:
-            print(f"### MOVE SLIDE #{current_idx} TO POSITION #{i}")
-            s = SlideOps(presentation_id, page=current_idx)
-            response = s.move_slide(i)
+def move_slide(presentation_id, target, curr_template, snapshot=None):
+    if snapshot is None:
+        snapshot = PresentationSnapshot(presentation_id)
+
+    # Move only the slides off the longest already-ordered run, all in one batchUpdate
+    slide_ids = [slide.get('objectId') for slide in snapshot.slides]
+    requests = plan_slide_moves(slide_ids, curr_template, target)
 
-            # Update position of elements after moving
-            orig_slide = curr_template.pop(current_idx)
-            curr_template.insert(i, orig_slide)
+    if requests:
+        print(f"### MOVE {len(requests)} SLIDES")
+        response = snapshot.batch_update(requests)
+        print(response)
 
+    curr_template[:] = target
     return curr_template
 
 
+def prepare_template(presentation_id, target, curr_template, snapshot=None):
+    if snapshot is None:
+        snapshot = PresentationSnapshot(presentation_id)
+
+    # Delete, duplicate and reorder in one atomic batchUpdate
+    requests = plan_template_restructure(snapshot.slides, curr_template, target)
+
+    if requests:
+        print(f"### RESTRUCTURE TEMPLATE WITH {len(requests)} REQUESTS")
+        response = snapshot.batch_update(requests)
+        print(response)
+
+    return list(target)
+
+
+def build_content_requests(s, slide):
+    # Get Textbox
+    textboxes = s.get_text_objects()
+
+    # Insert Title
+    requests = [
+        s.delete_text_from_textbox(textboxes[0]),
+        s.insert_plain_text(textboxes[0], text=slide.title),
+        s.delete_text_from_textbox(textboxes[1])
+    ]
+
+    if isinstance(slide.body_text, BulletPoints):
+        # Insert bullet list
+        bullet_items = slide.body_text.subject + "\n\t" + "\n\t".join(slide.body_text.points)
+        requests += s.insert_bullet_list(textboxes[1], bullet_items)
+    elif isinstance(slide.body_text, Description):
+        requests.append(
+            s.insert_plain_text(textboxes[1], text=slide.body_text.text + "\n")
+        )
+
+    # Get image shapes
+    image_shapes = s.get_image_objects()
+
+    for i, img_url in enumerate(slide.image_urls or []):
+        requests += s.insert_image(image_shapes[i], img_url) or []
+
+    return requests
+
+
+def update_presentation_content(presentation_id, slides, snapshot=None):
+    if snapshot is None:
+        snapshot = PresentationSnapshot(presentation_id)
+
+    # Collect the whole deck first, then send it in as few batchUpdates as the limits allow
+    groups = [
+        build_content_requests(SlideOps(presentation_id, page=i, snapshot=snapshot), slide)
+        for i, slide in enumerate(slides)
+    ]
+    batches = chunk_requests(groups)
+
+    for batch in batches:
+        snapshot.batch_update(batch)
+
+    print(f"Updated content of {len(slides)} slides in {len(batches)} batchUpdate call(s)")
+
+
 if __name__ == "__main__":
     with open('sample.txt', 'r', encoding='utf-8') as file:
         content = file.read()
@@ -240,13 +422,13 @@ if __name__ == "__main__":
         language="English"
     )
 
-    result = slide_gen_agent.run_sync("", deps=deps)
-    print(result)
+    presentation = generate_presentation(deps)
+    print(presentation)
 
     # -------------------------------------------------------------------------------
     # Edit presentation
 
-    layouts = [slide.layout for slide in result.data.slides]
+    layouts = [slide.layout for slide in presentation.slides]
     print(layouts)
 
     PRESENTATION_ID = "1grCs_IvDi99S5WHHBEajo4E_nb3P1UySIycvEk1tVfA"
@@ -264,40 +446,5 @@ if __name__ == "__main__":
     # result = prepare_presentation_agent.run_sync("", deps=deps)
     # print(result)
 
-    curr_template = delete_unnecessary_slide(PRESENTATION_ID, layouts, template)
-    curr_template = copy_slide(PRESENTATION_ID, layouts, curr_template)
-    curr_template = move_slide(PRESENTATION_ID, layouts, curr_template)
+    curr_template = prepare_template(PRESENTATION_ID, layouts, template)
     assert curr_template == layouts
-
-def update_presentation_content(presentation_id, slides):
-    for i, slide in enumerate(slides):
-        s = SlideOps(presentation_id, page=i)
-
-        # Get Textbox
-        textboxes = s.get_text_objects()
-
-        # Insert Title
-        requests = [
-            s.delete_text_from_textbox(textboxes[0]),
-            s.insert_plain_text(textboxes[0], text=slide.title),
-            s.delete_text_from_textbox(textboxes[1])
-        ]
-
-        if isinstance(slide.body_text, BulletPoints):
-            # Insert bullet list
-            bullet_items = slide.body_text.subject + "\n\t" + "\n\t".join(slide.body_text.points)
-            requests += s.insert_bullet_list(textboxes[1], bullet_items)
-        elif isinstance(slide.body_text, Description):
-            requests.append(
-                s.insert_plain_text(textboxes[1], text=slide.body_text.text + "\n")
-            )
-
-        # Get image shapes
-        image_shapes = s.get_image_objects()
-
-        for i, img_url in enumerate(slide.image_urls):
-            requests += s.insert_image(image_shapes[i], img_url)
-
-        # Call batch update
-        s.call_batch_update(requests)
-        print(f"Updated content slide #{i + 1}")
@@ -0,0 +1,170 @@
+from bisect import bisect_left
+from collections import Counter
+from .presentation_snapshot import iter_page_elements
+import json
+import uuid
+
+# Keep each batchUpdate comfortably below the API's request-count and payload limits
+MAX_BATCH_REQUESTS = 500
+MAX_BATCH_BYTES = 2 * 1024 * 1024
+
+
+def new_object_id():
+    # Slides object ids must be 5-50 chars of [a-zA-Z0-9_-:], starting with [a-zA-Z0-9_]
+    return f"gen_{uuid.uuid4().hex}"
+
+
+def assign_target_positions(current, target):
+    # The k-th occurrence of a layout in `current` goes to its k-th occurrence in `target`
+    if sorted(current) != sorted(target):
+        raise ValueError(f"Cannot reorder {current} into {target}: layouts differ")
+
+    slots = {}
+    for idx, layout in enumerate(target):
+        slots.setdefault(layout, []).append(idx)
+
+    return [slots[layout].pop(0) for layout in current]
+
+
+def longest_increasing_subsequence(seq):
+    # Patience sorting, O(n log n). Returns the indexes into `seq` that form the subsequence.
+    tails = []
+    tail_idx = []
+    parent = [None] * len(seq)
+
+    for i, value in enumerate(seq):
+        pos = bisect_left(tails, value)
+        if pos > 0:
+            parent[i] = tail_idx[pos - 1]
+
+        if pos == len(tails):
+            tails.append(value)
+            tail_idx.append(i)
+        else:
+            tails[pos] = value
+            tail_idx[pos] = i
+
+    result = []
+    i = tail_idx[-1] if tail_idx else None
+    while i is not None:
+        result.append(i)
+        i = parent[i]
+
+    return result[::-1]
+
+
+# Build the `updateSlidesPosition` requests turning `current` into `target`.
+# Slides on the longest increasing subsequence stay put, every other slide is moved
+# once, right behind its predecessor in `target`. Send them in order in one batchUpdate.
+def plan_slide_moves(slide_ids, current, target):
+    order = assign_target_positions(current, target)
+    keep = set(longest_increasing_subsequence(order))
+    by_target = {t: i for i, t in enumerate(order)}
+
+    # Simulated deck: arrangement[pos] is the index into `current` of the slide at pos
+    arrangement = list(range(len(current)))
+    requests = []
+
+    for t in range(len(target)):
+        i = by_target[t]
+        if i in keep:
+            continue
+
+        pos = arrangement.index(i)
+        insertion_index = 0 if t == 0 else arrangement.index(by_target[t - 1]) + 1
+        if pos == insertion_index:
+            continue
+
+        requests.append(
+            {
+                "updateSlidesPosition": {
+                    "slideObjectIds": [slide_ids[i]],
+                    "insertionIndex": insertion_index
+                }
+            }
+        )
+
+        # insertionIndex is based on the arrangement before the move
+        arrangement.pop(pos)
+        arrangement.insert(insertion_index if pos > insertion_index else insertion_index - 1, i)
+
+    return requests
+
+
+# Plan the whole template preparation as one batchUpdate: delete the slides whose
+# layout is not needed, duplicate the ones needed more than once, then reorder.
+# Duplicates get pre-assigned ids (slide and page elements) through
+# `duplicateObject.objectIds`, so the moves can refer to them in the same request.
+def plan_template_restructure(template_slides, curr_template, target):
+    if len(template_slides) != len(curr_template):
+        raise ValueError(
+            f"Template has {len(template_slides)} slides but {len(curr_template)} layouts were given"
+        )
+
+    needed = Counter(target)
+    missing = set(needed) - set(curr_template)
+    if missing:
+        raise ValueError(f"Template has no slide for layouts {sorted(missing)}")
+
+    requests = []
+    kept = []
+    n_kept = Counter()
+
+    for slide, layout in zip(template_slides, curr_template):
+        if n_kept[layout] < needed[layout]:
+            kept.append((slide, layout))
+            n_kept[layout] += 1
+        else:
+            requests.append({"deleteObject": {"objectId": slide["objectId"]}})
+
+    # Deck after deletes and duplicates, as (slide id, layout)
+    deck = [(slide["objectId"], layout) for slide, layout in kept]
+
+    for slide, layout in kept:
+        n_copies = needed[layout] - n_kept[layout]
+        # The first kept slide of a layout covers the whole shortage
+        n_kept[layout] = needed[layout]
+
+        for _ in range(n_copies):
+            object_ids = {slide["objectId"]: new_object_id()}
+            for element in iter_page_elements(slide.get("pageElements", [])):
+                object_ids[element["objectId"]] = new_object_id()
+
+            requests.append(
+                {
+                    "duplicateObject": {
+                        "objectId": slide["objectId"],
+                        "objectIds": object_ids
+                    }
+                }
+            )
+
+            # A duplicate is inserted right after its source
+            source_pos = deck.index((slide["objectId"], layout))
+            deck.insert(source_pos + 1, (object_ids[slide["objectId"]], layout))
+
+    slide_ids = [slide_id for slide_id, _ in deck]
+    requests += plan_slide_moves(slide_ids, [layout for _, layout in deck], target)
+
+    return requests
+
+
+# Pack groups of requests into as few batchUpdates as the limits allow. A group
+# (e.g. all requests of one slide) is never split across two batches.
+def chunk_requests(groups, max_requests=MAX_BATCH_REQUESTS, max_bytes=MAX_BATCH_BYTES):
+    batches = []
+    batch, batch_bytes = [], 0
+
+    for group in groups:
+        group_bytes = len(json.dumps(group))
+        if batch and (len(batch) + len(group) > max_requests or batch_bytes + group_bytes > max_bytes):
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+
+        batch += group
+        batch_bytes += group_bytes
+
+    if batch:
+        batches.append(batch)
+
+    return batches
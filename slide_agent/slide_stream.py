@@ -0,0 +1,287 @@
+import asyncio
+import json
+from .async_slide_ops import AsyncSlideOps
+from .presentation_model import TEMPLATE_LAYOUTS
+from .slide_gen import build_content_requests
+from .slide_planner import chunk_requests, new_object_id
+from .presentation_snapshot import iter_page_elements
+
+
+class SlideStreamParser:
+    # Pulls complete `slides[i]` objects out of the Presentation tool-call arguments
+    # while they are streamed. Arguments come as JSON text deltas, or as whole
+    # dicts from providers (e.g. Gemini) that send function calls in one piece.
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # A new tool call (e.g. a retry after failed validation) starts from scratch
+        self.buffer = ""
+        self.pos = 0
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_string = None
+        self.key = None
+        self.slides_depth = None
+        self.item_start = None
+        self.emitted = 0
+
+    def feed(self, delta):
+        # Returns the slide dicts completed by this delta
+        if not delta:
+            return []
+        if isinstance(delta, dict):
+            slides = delta.get("slides") or []
+            items = slides[self.emitted:]
+            self.emitted = max(self.emitted, len(slides))
+            return items
+
+        self.buffer += delta
+        items = []
+
+        while self.pos < len(self.buffer):
+            ch = self.buffer[self.pos]
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    self.last_string = self.buffer[self.string_start + 1:self.pos]
+            elif ch == '"':
+                self.in_string = True
+                self.string_start = self.pos
+            elif ch == ":":
+                self.key = self.last_string
+            elif ch == ",":
+                self.key = None
+            elif ch in "{[":
+                parent_key = self.key if self.stack and self.stack[-1] == "{" else None
+                self.stack.append(ch)
+                self.key = None
+
+                # "slides" of the root object, then every object directly inside it
+                if ch == "[" and parent_key == "slides" and len(self.stack) == 2:
+                    self.slides_depth = 2
+                elif ch == "{" and self.slides_depth is not None and len(self.stack) == self.slides_depth + 1:
+                    self.item_start = self.pos
+            elif ch in "}]":
+                if ch == "}" and self.item_start is not None and len(self.stack) == self.slides_depth + 1:
+                    items.append(json.loads(self.buffer[self.item_start:self.pos + 1]))
+                    self.item_start = None
+                elif ch == "]" and len(self.stack) == self.slides_depth:
+                    self.slides_depth = None
+
+                if self.stack:
+                    self.stack.pop()
+
+            self.pos += 1
+
+        self.emitted += len(items)
+        return items
+
+
+class IncrementalDeckWriter:
+    # Writes slides to the deck while the model is still producing the rest.
+    # Every slide becomes a copy of the template slide of its layout (ids
+    # pre-assigned), appended behind everything else and filled in the same
+    # batchUpdate. finish() deletes the template slides, leaving the generated deck.
+    #
+    # Requests are planned in submit() on the shared snapshot, so ids and positions
+    # follow submission order; a worker sends them, merging whatever queued up
+    # while the previous batchUpdate was in flight.
+    #
+    # After a failed batch (or a submit() that left the snapshot unusable) finish()
+    # reloads the deck and writes every slide again. close() always stops the worker,
+    # and removes what was written unless finish() completed.
+    def __init__(self, presentation_id, snapshot, template_layouts=TEMPLATE_LAYOUTS):
+        self.presentation_id = presentation_id
+        self.snapshot = snapshot
+        self.template_layouts = list(template_layouts)
+        self.slides = []
+        self.slide_ids = []
+        self.stale_ids = []
+        self.batches = 0
+        self.queue = asyncio.Queue()
+        self.worker = None
+        self.error = None
+        self.closed = False
+        self.finished = False
+
+    async def start(self):
+        await self.snapshot.refresh()
+
+        template = self.snapshot.slides
+        if len(template) != len(self.template_layouts):
+            raise ValueError(
+                f"Template has {len(template)} slides but {len(self.template_layouts)} layouts were given"
+            )
+
+        self.template_slide_ids = [slide["objectId"] for slide in template]
+        self.layout_slide_ids = {}
+        for slide, layout in zip(template, self.template_layouts):
+            self.layout_slide_ids.setdefault(layout, slide["objectId"])
+
+        self.worker = asyncio.create_task(self._run())
+
+    def submit(self, slide):
+        if self.error is not None:
+            raise self.error
+        if slide.layout not in self.layout_slide_ids:
+            raise ValueError(f"Template has no slide for layout {slide.layout!r}")
+
+        try:
+            slide_id, requests = self._plan(slide)
+        except Exception:
+            # Whatever was applied locally never reaches the queue; finish() reloads the deck
+            self.snapshot.invalidate()
+            raise
+
+        print(f"### PUSH SLIDE #{len(self.slides)} ({slide.layout})")
+        self.slides.append(slide)
+        self.slide_ids.append(slide_id)
+        self.queue.put_nowait(requests)
+
+    def _plan(self, slide):
+        template_id = self.layout_slide_ids[slide.layout]
+        template = self.snapshot.get_slide(template_id)
+
+        object_ids = {template_id: new_object_id()}
+        for element in iter_page_elements(template.get("pageElements", [])):
+            object_ids[element["objectId"]] = new_object_id()
+        slide_id = object_ids[template_id]
+
+        requests = [
+            {
+                "duplicateObject": {
+                    "objectId": template_id,
+                    "objectIds": object_ids
+                }
+            },
+            {
+                # The copy lands right after its template; send it behind the last slide
+                "updateSlidesPosition": {
+                    "slideObjectIds": [slide_id],
+                    "insertionIndex": len(self.snapshot.slides) + 1
+                }
+            }
+        ]
+
+        # Ids are pre-assigned, so the reply is known and the copy can be filled right away
+        self.snapshot.apply_replies(requests, {"replies": [{"duplicateObject": {"objectId": slide_id}}, {}]})
+        s = AsyncSlideOps(self.presentation_id, page=len(self.snapshot.slides) - 1, snapshot=self.snapshot)
+        content = build_content_requests(s, slide)
+        self.snapshot.apply_replies(content, {})
+
+        if self.snapshot.is_stale:
+            raise RuntimeError(f"Could not plan slide {slide.title!r} on the local snapshot")
+
+        return slide_id, requests + content
+
+    def restart(self):
+        # The model started over: what was written so far goes away in finish()
+        self.stale_ids += self.slide_ids
+        self.slides = []
+        self.slide_ids = []
+
+    async def _run(self):
+        while True:
+            groups = [await self.queue.get()]
+            while not self.queue.empty():
+                groups.append(self.queue.get_nowait())
+
+            stop = None in groups
+            groups = [group for group in groups if group is not None]
+
+            try:
+                if self.error is None and not self.closed:
+                    for batch in chunk_requests(groups):
+                        await self.snapshot.client.batch_update(self.presentation_id, batch)
+                        self.batches += 1
+            except Exception as e:
+                # Later groups depend on this one; drop them and report in finish()
+                self.error = e
+                self.snapshot.invalidate()
+            finally:
+                for _ in range(len(groups) + int(stop)):
+                    self.queue.task_done()
+
+            if stop:
+                return
+
+    async def _resync(self):
+        # Let the worker drop what is still queued, then start over from the deck as it
+        # is: our slides that made it are stale, everything is planned again
+        await self.queue.join()
+        print(f"Deck writer lost track of the deck ({self.error or 'snapshot invalidated'}), rewriting it")
+
+        self.error = None
+        await self.snapshot.refresh()
+        existing = {slide["objectId"] for slide in self.snapshot.slides}
+
+        self.restart()
+        self.stale_ids = [object_id for object_id in self.stale_ids if object_id in existing]
+
+    async def finish(self, slides):
+        # Push whatever the stream didn't deliver (or delivered differently), drop the
+        # template and stale slides, and wait for every batch to land
+        try:
+            if self.error is not None or self.snapshot.is_stale:
+                await self._resync()
+
+            if self.slides != list(slides[:len(self.slides)]):
+                print("Streamed slides differ from the final result, rewriting the deck")
+                self.restart()
+
+            for slide in slides[len(self.slides):]:
+                self.submit(slide)
+
+            requests = [
+                {"deleteObject": {"objectId": object_id}}
+                for object_id in self.template_slide_ids + self.stale_ids
+            ]
+            self.snapshot.apply_replies(requests, {})
+            self.queue.put_nowait(requests)
+        finally:
+            await self._stop()
+
+        if self.error is not None:
+            raise self.error
+
+        self.finished = True
+        print(f"Wrote {len(self.slides)} slides in {self.batches} batchUpdate call(s)")
+        return self.slide_ids
+
+    async def _stop(self):
+        if self.worker is None or self.worker.done():
+            return
+
+        self.queue.put_nowait(None)
+        await self.queue.join()
+        await self.worker
+
+    async def close(self):
+        # Always safe to call: stops the worker and, unless finish() completed, deletes
+        # every slide written so far, leaving the deck as the template it was
+        if self.finished or self.worker is None:
+            return
+
+        self.closed = True
+        await self._stop()
+
+        try:
+            await self.snapshot.refresh()
+            existing = {slide["objectId"] for slide in self.snapshot.slides}
+            written = [object_id for object_id in self.stale_ids + self.slide_ids if object_id in existing]
+
+            if written:
+                await self.snapshot.client.batch_update(
+                    self.presentation_id, [{"deleteObject": {"objectId": object_id}} for object_id in written]
+                )
+                print(f"Removed {len(written)} partially written slides")
+        except Exception as e:
+            print(f"Could not remove partially written slides: {e}")
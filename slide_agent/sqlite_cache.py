@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class SqliteCache:
+    # SQLite table of values keyed by a content hash. Entries older than `ttl` seconds
+    # are ignored and purged; beyond `max_entries` the least recently used ones are
+    # dropped. Purging runs when the cache is opened and every `evict_every` puts.
+    # Subclasses name the table and the value columns, as (name, SQL type) pairs.
+    table = None
+    columns = ()
+    evict_every = 100
+
+    def __init__(self, path, ttl, max_entries):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.puts = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        # One connection shared by every thread, serialized by the lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        columns = "".join(f" {name} {kind} NOT NULL," for name, kind in self.columns)
+        with self.conn:
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                " key TEXT PRIMARY KEY,"
+                f"{columns}"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+
+        self.evict()
+
+    def get(self, key):
+        # The value columns as a tuple (a single column comes back bare), or None
+        now = time.time()
+        names = ", ".join(name for name, _ in self.columns)
+
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {names}, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or (self.ttl is not None and row[-1] < now - self.ttl):
+                self.misses += 1
+                return None
+
+            with self.conn:
+                self.conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+
+            self.hits += 1
+            return row[0] if len(self.columns) == 1 else row[:-1]
+
+    def put(self, key, *values):
+        now = time.time()
+        placeholders = ", ".join("?" * (len(values) + 3))
+
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} VALUES ({placeholders})",
+                (key, *values, now, now),
+            )
+            self.puts += 1
+            due = self.puts % self.evict_every == 0
+
+        if due:
+            self.evict()
+
+    def evict(self):
+        # Number of entries left
+        with self.lock, self.conn:
+            if self.ttl is not None:
+                self.conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.ttl,))
+
+            self.conn.execute(
+                f"DELETE FROM {self.table} WHERE key NOT IN "
+                f"(SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+            return self.conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,160 @@
+import asyncio
+import re
+from contextlib import nullcontext
+from dataclasses import replace
+from pydantic_ai import Agent
+from .presentation_model import Content, SectionSummary
+from .run_accounting import RunAccount
+from .run_cache import get_run_cache, run_key
+
+SUMMARIZER_MODEL_NAME = 'google-gla:gemini-2.0-flash'
+
+# Sources longer than this are summarized section by section before generation
+LONG_CONTENT_CHARS = 20000
+# Sections longer than this are summarized in pieces
+CHUNK_CHARS = 6000
+SUMMARIZE_CONCURRENCY = 8
+
+SUMMARIZER_PROMPT = """
+You condense one section of a source document that will be turned into presentation slides.
+Keep the section heading, the key claims, numbers, results, figure/table references and citations.
+Drop repetition and filler. Answer in the language of the section.
+"""
+
+summarizer_agent = Agent(
+    SUMMARIZER_MODEL_NAME,
+    result_type=SectionSummary,
+    system_prompt=SUMMARIZER_PROMPT,
+    model_settings={"temperature": 0.0},
+    defer_model_check=True
+)
+
+# A line of dashes (the separators in sample.txt) or a markdown heading starts a new section
+SEPARATOR = re.compile(r"^\s*-{3,}\s*$")
+HEADING = re.compile(r"^#{1,6}\s+\S")
+
+
+def split_sections(text):
+    sections, lines = [], []
+
+    for line in text.splitlines():
+        if SEPARATOR.match(line):
+            sections.append("\n".join(lines))
+            lines = []
+            continue
+
+        if HEADING.match(line) and any(l.strip() for l in lines):
+            sections.append("\n".join(lines))
+            lines = []
+
+        lines.append(line)
+
+    sections.append("\n".join(lines))
+    return [section.strip() for section in sections if section.strip()]
+
+
+def _split_lines(section, max_chars):
+    # Lines of a section, a line longer than `max_chars` cut into pieces that fit
+    for line in section.splitlines():
+        while len(line) > max_chars:
+            yield line[:max_chars]
+            line = line[max_chars:]
+        yield line
+
+
+def _split_long(section, max_chars):
+    # Paragraphs (then lines) of a section larger than one chunk
+    pieces, current = [], ""
+    for line in _split_lines(section, max_chars):
+        if current and len(current) + len(line) + 1 > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+
+    if current:
+        pieces.append(current)
+
+    return pieces
+
+
+def section_chunks(section, max_chars=CHUNK_CHARS):
+    # A section is summarized on its own; one longer than `max_chars` is cut into
+    # pieces, each carrying the section's first line (its heading) for context
+    if len(section) <= max_chars:
+        return [section]
+
+    # A first line too long to be a heading only keeps its start as context
+    heading = section.splitlines()[0][:max_chars // 4]
+    pieces = _split_long(section, max_chars - len(heading) - 1)
+    return pieces[:1] + [f"{heading}\n{piece}" for piece in pieces[1:]]
+
+
+def merge_summaries(summaries):
+    # One summary per section: pieces of a long section share its first heading
+    return SectionSummary(heading=summaries[0].heading, points=[point for s in summaries for point in s.points])
+
+
+def render_outline(summaries):
+    lines = []
+    for summary in summaries:
+        lines.append(f"## {summary.heading}")
+        lines += [f"- {point}" for point in summary.points]
+        lines.append("")
+
+    return "\n".join(lines).strip()
+
+
+async def summarize_chunk(chunk, cache=None, gemini_slots=None):
+    # `gemini_slots`: a limit shared with other Gemini callers (image_utils.gemini_slots()),
+    # held for the model call only, so cache hits don't wait for a slot
+    cache = cache if cache is not None else get_run_cache()
+    key = run_key(SUMMARIZER_PROMPT, SUMMARIZER_MODEL_NAME, summarizer_agent.model_settings,
+                  SectionSummary.model_json_schema(), chunk)
+
+    cached = cache.get(key)
+    if cached is not None:
+        RunAccount(SUMMARIZER_MODEL_NAME, SUMMARIZER_PROMPT + chunk, cached=True, stage="summarize") \
+            .finish().write_json_lines()
+        return SectionSummary.model_validate_json(cached)
+
+    async with gemini_slots or nullcontext():
+        account = RunAccount(SUMMARIZER_MODEL_NAME, SUMMARIZER_PROMPT + chunk, stage="summarize")
+        result = await summarizer_agent.run(chunk)
+        account.finish(result.usage())
+
+    summary = result.data
+    cache.put(key, summary.model_dump_json())
+    account.write_json_lines()
+
+    return summary
+
+
+async def summarize_content(text, max_chars=CHUNK_CHARS, max_concurrency=SUMMARIZE_CONCURRENCY, cache=None,
+                            gemini_slots=None):
+    # Map: summarize every section (every piece of a long one) concurrently.
+    # Reduce: join the summaries, in source order, into one outline.
+    sections = [section_chunks(section, max_chars) for section in split_sections(text)]
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def summarize(chunk):
+        async with semaphore:
+            return await summarize_chunk(chunk, cache, gemini_slots)
+
+    async def summarize_section(chunks):
+        return merge_summaries(await asyncio.gather(*(summarize(chunk) for chunk in chunks)))
+
+    summaries = await asyncio.gather(*(summarize_section(chunks) for chunks in sections))
+    print(f"Summarized {len(text)} chars in {len(sections)} sections ({sum(map(len, sections))} chunks)")
+
+    return render_outline(summaries)
+
+
+async def condense_content_async(deps: Content, threshold=LONG_CONTENT_CHARS, cache=None,
+                                 gemini_slots=None) -> Content:
+    # Deps whose content is an outline of the source, when the source is long. Async
+    # only: callers already run inside an event loop (Chainlit, batch.py, and the
+    # loop generate_presentation() drives)
+    if len(deps.content) <= threshold:
+        return deps
+
+    return replace(deps, content=await summarize_content(deps.content, cache=cache, gemini_slots=gemini_slots))
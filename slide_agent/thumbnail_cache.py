@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+
+THUMBNAIL_CACHE_DIR = os.environ.get("SLIDE_GEN_THUMBNAIL_CACHE", os.path.join(".cache", "thumbnails"))
+THUMBNAIL_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Keys whose values change on every fetch without the page changing (signed, short-lived URLs)
+VOLATILE_KEYS = {"contentUrl"}
+
+
+def _strip_volatile(value):
+    if isinstance(value, dict):
+        return {key: _strip_volatile(item) for key, item in value.items() if key not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_strip_volatile(item) for item in value]
+
+    return value
+
+
+def page_fingerprint(page, thumbnail_properties=None):
+    # revisionId belongs to the whole presentation and moves on any edit,
+    # so a page is identified by a hash of its own content instead.
+    payload = {"page": _strip_volatile(page), "thumbnail": thumbnail_properties or {}}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def _safe(object_id):
+    # Slides ids may contain ':'
+    return object_id.replace(":", "_")
+
+
+class ThumbnailCache:
+    # On-disk cache: <root>/<presentation id>/<page id>/<fingerprint>.png.
+    # Reads touch the file, and eviction drops the least recently used files
+    # until the cache fits in `max_bytes`.
+    def __init__(self, root=THUMBNAIL_CACHE_DIR, max_bytes=THUMBNAIL_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _page_dir(self, presentation_id, page_id):
+        return os.path.join(self.root, _safe(presentation_id), _safe(page_id))
+
+    def get(self, presentation_id, page_id, fingerprint):
+        path = os.path.join(self._page_dir(presentation_id, page_id), f"{fingerprint}.png")
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return path
+
+    def put(self, presentation_id, page_id, fingerprint, src_path):
+        page_dir = self._page_dir(presentation_id, page_id)
+        os.makedirs(page_dir, exist_ok=True)
+
+        # Older renders of the same page can't be served anymore
+        for name in os.listdir(page_dir):
+            if name != f"{fingerprint}.png":
+                _remove(os.path.join(page_dir, name))
+
+        path = os.path.join(page_dir, f"{fingerprint}.png")
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, path)
+
+        return path
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                _remove(path)
+                total -= size
+
+            return total
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,10 +1,197 @@
 from googleapiclient.errors import HttpError
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import asyncio
+import functools
+import random
+import socket
+import threading
+import time
+from .metrics import METRICS
 
-def call_api_decorator(func):
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# batchUpdate is not idempotent: after a 5xx or a timeout the server may have applied
+# it (a duplicateObject twice, or "already exists" for pre-assigned ids). Only a 429
+# says the request was rejected unapplied.
+WRITE_RETRYABLE_STATUS = {429}
+MAX_RETRIES = 6
+BASE_DELAY = 1.0
+MAX_DELAY = 64.0
+
+# Default Slides API quotas, requests per minute (per user, per project)
+SLIDES_READ_QUOTA = (600, 3000)
+SLIDES_WRITE_QUOTA = (60, 600)
+SLIDES_EXPENSIVE_READ_QUOTA = (60, 300)
+
+
+class RateLimiter:
+    # One token bucket per quota. A call waits until the tightest bucket has a token,
+    # so a burst is smoothed to the quota instead of being answered with 429s.
+    def __init__(self, *per_minute):
+        self.rates = [limit / 60.0 for limit in per_minute]
+        self.capacity = [max(1.0, limit / 6.0) for limit in per_minute]
+        self.tokens = list(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.enabled = True
+
+    def reserve(self, tokens=1):
+        # Take the tokens now and return how long the caller has to wait before using them
+        if not self.enabled:
+            return 0.0
+
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.updated
+            self.updated = now
+
+            delay = 0.0
+            for i, rate in enumerate(self.rates):
+                self.tokens[i] = min(self.capacity[i], self.tokens[i] + elapsed * rate) - tokens
+                delay = max(delay, -self.tokens[i] / rate)
+
+            return delay
+
+    def acquire(self, tokens=1):
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+        return delay
+
+
+class Slots:
+    # At most `n` callers at once, threads (`with slots`) and coroutines (`async with
+    # slots`) alike, so one limit covers a service used from both. Coroutines poll
+    # instead of blocking the event loop (or parking a thread) while waiting.
+    POLL_SECONDS = 0.02
+
+    def __init__(self, n):
+        self.n = n
+        self.semaphore = threading.BoundedSemaphore(n)
+
+    def __enter__(self):
+        self.semaphore.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.semaphore.release()
+
+    async def __aenter__(self):
+        while not self.semaphore.acquire(blocking=False):
+            await asyncio.sleep(self.POLL_SECONDS)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.semaphore.release()
+
+
+class RetryStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.backoff_seconds = 0.0
+        self.throttled_seconds = 0.0
+
+    def record(self, calls=0, retries=0, failures=0, backoff_seconds=0.0, throttled_seconds=0.0):
+        with self.lock:
+            self.calls += calls
+            self.retries += retries
+            self.failures += failures
+            self.backoff_seconds += backoff_seconds
+            self.throttled_seconds += throttled_seconds
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "backoff_seconds": self.backoff_seconds,
+                "throttled_seconds": self.throttled_seconds,
+            }
+
+
+RETRY_STATS = RetryStats()
+SLIDES_READ_LIMITER = RateLimiter(*SLIDES_READ_QUOTA)
+SLIDES_WRITE_LIMITER = RateLimiter(*SLIDES_WRITE_QUOTA)
+SLIDES_EXPENSIVE_READ_LIMITER = RateLimiter(*SLIDES_EXPENSIVE_READ_QUOTA)
+
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(attempt, retry_after=None):
+    if retry_after is not None:
+        return min(retry_after, MAX_DELAY)
+
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+
+
+def is_retryable(error, idempotent=True):
+    if isinstance(error, HttpError):
+        return error.resp.status in (RETRYABLE_STATUS if idempotent else WRITE_RETRYABLE_STATUS)
+
+    if not idempotent:
+        # Refused connections never reached the server; anything later might have
+        return isinstance(error, ConnectionRefusedError)
+
+    return isinstance(error, (ConnectionError, TimeoutError, socket.timeout))
+
+
+def call_api_decorator(func=None, *, limiter=None, max_retries=MAX_RETRIES, stage=None, idempotent=True):
+    # Usable bare (`@call_api_decorator`) or configured (`@call_api_decorator(limiter=...)`).
+    # `stage` names the call in METRICS; its latency includes throttling and retries.
+    # Writes pass idempotent=False and are only retried when they surely weren't applied.
+    if func is None:
+        return functools.partial(call_api_decorator, limiter=limiter, max_retries=max_retries, stage=stage,
+                                 idempotent=idempotent)
+
+    stage = stage or func.__name__
+
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        try:
-            return func(*args, **kwargs)
-        except HttpError as e:
-            print(e)
+        with METRICS.timed(stage):
+            attempt = 0
+            while True:
+                if limiter is not None:
+                    RETRY_STATS.record(throttled_seconds=limiter.acquire())
+
+                try:
+                    RETRY_STATS.record(calls=1)
+                    return func(*args, **kwargs)
+                except (HttpError, ConnectionError, TimeoutError, socket.timeout) as e:
+                    if not is_retryable(e, idempotent) or attempt >= max_retries:
+                        RETRY_STATS.record(failures=1)
+                        print(e)
+                        raise
+
+                    retry_after = parse_retry_after(e.resp.get("retry-after")) if isinstance(e, HttpError) else None
+                    delay = retry_delay(attempt, retry_after)
+                    print(f"Retrying {func.__name__} in {delay:.1f}s (attempt {attempt + 1}/{max_retries}): {e}")
+
+                RETRY_STATS.record(retries=1, backoff_seconds=delay)
+                METRICS.record_retry(stage)
+                time.sleep(delay)
+                attempt += 1
 
-    return wrapper
\ No newline at end of file
+    return wrapper
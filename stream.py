@@ -1,3 +1,4 @@
+from pydantic import ValidationError
 from pydantic_ai import Agent, RunContext
 import chainlit as cl
 from pydantic_ai.messages import (
@@ -7,12 +8,19 @@ from pydantic_ai.messages import (
     PartDeltaEvent,
     PartStartEvent,
     TextPartDelta,
+    ToolCallPart,
     ToolCallPartDelta,
 )
 from chainlit.input_widget import TextInput
+import os
+import time
 import webbrowser
-from slide_agent.presentation_model import ImageData, Content, BulletPoints
-from slide_agent.slide_gen import slide_gen_agent, delete_unnecessary_slide, copy_slide, move_slide, update_presentation_content
+from slide_agent.metrics import METRICS, METRICS_HOST, METRICS_PORT, start_run_metrics, diff_snapshots, summarize, serve_metrics
+from slide_agent.presentation_model import ImageData, Content, BulletPoints, Slide, TEMPLATE_LAYOUTS
+from slide_agent.slide_gen import generate_presentation_async
+from slide_agent.slide_stream import SlideStreamParser, IncrementalDeckWriter
+from slide_agent.async_slide_ops import AsyncPresentationSnapshot, generate_deck_thumbnails_async
+from slide_agent.thumbnail_cache import ThumbnailCache
 
 def prepare():
     with open('sample.txt', 'r', encoding='utf-8') as file:
@@ -132,6 +140,67 @@ def prepare():
 
 output_messages: list[str] = []
 
+THUMBNAIL_DIR = "thumbnail"
+thumbnail_cache = ThumbnailCache()
+
+# Per-stage metrics of every generation are appended here as JSON lines
+METRICS_PATH = os.environ.get("SLIDE_GEN_METRICS_PATH", "metrics.jsonl")
+
+
+metrics_server = None
+
+
+# Prometheus endpoint on its own port: Chainlit's catch-all route answers every
+# path of its app with the UI, so a /metrics route there is never reached
+@cl.on_app_startup
+def start_metrics_server():
+    global metrics_server
+
+    host = os.environ.get("SLIDE_GEN_METRICS_HOST", METRICS_HOST)
+    port = int(os.environ.get("SLIDE_GEN_METRICS_PORT", METRICS_PORT))
+    try:
+        metrics_server = serve_metrics(port, host)
+    except OSError as e:
+        print(f"Metrics endpoint not started: {e}")
+
+
+@cl.on_app_shutdown
+def stop_metrics_server():
+    if metrics_server is not None:
+        metrics_server.shutdown()
+        metrics_server.server_close()
+
+
+def start_task(run_metrics):
+    return time.perf_counter(), run_metrics.snapshot()
+
+
+def finish_task(task, started, run_metrics):
+    start_time, before = started
+    stages = diff_snapshots(before, run_metrics.snapshot())
+
+    task.title = f"{task.title} ({time.perf_counter() - start_time:.1f}s, {summarize(stages)})"
+    task.status = cl.TaskStatus.DONE
+
+async def stream_presentation(msg, presentation):
+    for slide in presentation.slides:
+        await msg.stream_token(f"### PAGE {slide.page}: {slide.title}\n\n")
+
+        if isinstance(slide.body_text, BulletPoints):
+            await msg.stream_token(f"{slide.body_text.subject}\n")
+            for point in slide.body_text.points:
+                await msg.stream_token(f"- {point}\n")
+        else:
+            await msg.stream_token(f"{slide.body_text.text}\n")
+
+        if slide.image_urls:
+            await msg.stream_token(f"\nImages:\n\n")
+
+            for url in slide.image_urls:
+                await msg.stream_token(f"![]({url})")
+
+        await msg.stream_token("\n\n-------------------------------------\n\n")
+
 @cl.on_chat_start
 async def start_chat():
     cl.user_session.set(
@@ -184,15 +253,59 @@ async def main(message: cl.Message):
         language="English"
     )
 
+    run_metrics = start_run_metrics()
+
     task_list = cl.TaskList()
     task_list.status = "Running..."
 
     task1 = cl.Task(title="Synthesizing data for the presentation", status=cl.TaskStatus.RUNNING)
+    task1_started = start_task(run_metrics)
     await task_list.add_task(task1)
+
+    # Slides are written to the deck as soon as the model has produced them, so the
+    # Slides API work overlaps generation instead of following it
+    task2 = cl.Task(title="Write slides to the presentation", status=cl.TaskStatus.RUNNING)
+    task2_started = start_task(run_metrics)
+    await task_list.add_task(task2)
     await task_list.send()
 
-    async with slide_gen_agent.iter("", deps=deps) as run:
-        async for node in run:
+    PRESENTATION_ID = cl.user_session.get("presentation_id")
+    snapshot = AsyncPresentationSnapshot(PRESENTATION_ID)
+    writer = IncrementalDeckWriter(PRESENTATION_ID, snapshot, TEMPLATE_LAYOUTS)
+    await writer.start()
+
+    # Whatever happens to the run, the worker stops and a half-written deck is removed
+    try:
+        parser = SlideStreamParser()
+        pipelined = True
+
+        def push_slides(args):
+            nonlocal pipelined
+            if not pipelined:
+                return
+
+            for item in parser.feed(args):
+                try:
+                    slide = Slide.model_validate(item)
+                except ValidationError as e:
+                    # The final result will be validated (and retried) by the agent; finish() writes it
+                    print(f"Streamed slide failed validation, waiting for the final result: {e}")
+                    pipelined = False
+                    return
+
+                try:
+                    writer.submit(slide)
+                except Exception as e:
+                    # e.g. a failed batchUpdate: stop pipelining, finish() rewrites the deck from the result
+                    print(f"Could not write streamed slide, waiting for the final result: {e}")
+                    pipelined = False
+                    return
+
+        nodes = 0
+
+        def on_node(node):
+            nonlocal nodes
+            nodes += 1
             print(node)
             if Agent.is_user_prompt_node(node):
                 # A user prompt node => The user has provided input
@@ -204,31 +317,6 @@ async def main(message: cl.Message):
                     '=== ModelRequestNode: streaming partial request tokens ===\n'
                 )
                 # await msg.stream_token('=== ModelRequestNode: streaming partial request tokens ===\n')
-
-                async with node.stream(run.ctx) as request_stream:
-                    async for event in request_stream:
-                        if isinstance(event, PartStartEvent):
-                            output_messages.append(
-                                f"[Request] Starting part {event.index}: {event.part!r}"
-                            )
-                            # await msg.stream_token(f"[Request] Starting part {event.index}: {event.part!r}")
-
-                        elif isinstance(event, PartDeltaEvent):
-                            if isinstance(event.delta, TextPartDelta):
-                                output_messages.append(
-                                    f'[Request] Part {event.index} text delta: {event.delta.content_delta!r}'
-                                )
-                                # await msg.stream_token(f'[Request] Part {event.index} text delta: {event.delta.content_delta!r}')
-                            elif isinstance(event.delta, ToolCallPartDelta):
-                                output_messages.append(
-                                    f'[Request] Part {event.index} args.delta={event.delta.args_delta}'
-                                )
-                                # await msg.stream_token(f'[Request] Part {event.index} args.delta={event.delta.args_delta}')
-                        elif isinstance(event, FinalResultEvent):
-                            output_messages.append(
-                                f'[Result] The model produced a final result (tool_name={event.tool_name}'
-                            )
-                            # await msg.stream_token(f'[Result] The model produced a final result (tool_name={event.tool_name}')
             elif Agent.is_call_tools_node(node):
                 # A handle-response node => The model returned some data, potentially calls a tool
                 output_messages.append(
@@ -236,95 +324,92 @@ async def main(message: cl.Message):
                 )
                 # await msg.stream_token('=== CallToolNode: streaming partial response & tool usage ===')
 
-                async with node.stream(run.ctx) as handle_stream:
-                    async for event in handle_stream:
-                        if isinstance(event, FunctionToolCallEvent):
-                            output_messages.append(
-                                f'[Tools] The LLM calls tool={event.part.tool_name!r} with args={event.part.args} (tool_call_id={event.part.tool_call_id!r}'
-                            )
-
-                            # await msg.stream_token(f'[Tools] The LLM calls tool={event.part.tool_name!r} with args={event.part.args} (tool_call_id={event.part.tool_call_id!r}')
-                        elif isinstance(event, FunctionToolResultEvent):
-                            output_messages.append(
-                                f'[Tools] Tool call {event.tool_call_id!r} returned => {event.result.content}'
-                            )
-                            # await msg.stream_token(f'[Tools] Tool call {event.tool_call_id!r} returned => {event.result.content}')
-            elif Agent.is_end_node(node):
-                assert run.result.data == node.data.data
-
-                final_result = run.result.data
-                # Once an End node is reached, the agent run is complete
-                output_messages.append(f'=== Final Agent Output: {run.result.data} ===')
-
-                for slide in run.result.data.slides:
-                    await msg.stream_token(f"### PAGE {slide.page}: {slide.title}\n\n")
-
-                    if isinstance(slide.body_text, BulletPoints):
-                        await msg.stream_token(f"{slide.body_text.subject}\n")
-                        for point in slide.body_text.points:
-                            await msg.stream_token(f"- {point}\n")
-                    else:
-                        await msg.stream_token(f"{slide.body_text.text}\n")
-
-                    if slide.image_urls:
-                        await msg.stream_token(f"\nImages:\n\n")
-
-                        for url in slide.image_urls:
-                            await msg.stream_token(f"![]({url})")
-
-                    await msg.stream_token("\n\n-------------------------------------\n\n")
-
-
-    message_history.append({"role": "assistant", "content": msg.content})
-    await msg.update()
+        def on_event(event):
+            nonlocal pipelined
+            if isinstance(event, PartStartEvent):
+                output_messages.append(
+                    f"[Request] Starting part {event.index}: {event.part!r}"
+                )
 
-    task1.status = cl.TaskStatus.DONE
-    task2 = cl.Task(title="Prepare template for the presentation", status=cl.TaskStatus.RUNNING)
+                if isinstance(event.part, ToolCallPart):
+                    # A new result tool call (e.g. a retry) replaces everything streamed before
+                    parser.reset()
+                    writer.restart()
+                    pipelined = True
+                    push_slides(event.part.args)
+                # await msg.stream_token(f"[Request] Starting part {event.index}: {event.part!r}")
+
+            elif isinstance(event, PartDeltaEvent):
+                if isinstance(event.delta, TextPartDelta):
+                    output_messages.append(
+                        f'[Request] Part {event.index} text delta: {event.delta.content_delta!r}'
+                    )
+                    # await msg.stream_token(f'[Request] Part {event.index} text delta: {event.delta.content_delta!r}')
+                elif isinstance(event.delta, ToolCallPartDelta):
+                    output_messages.append(
+                        f'[Request] Part {event.index} args.delta={event.delta.args_delta}'
+                    )
+                    push_slides(event.delta.args_delta)
+                    # await msg.stream_token(f'[Request] Part {event.index} args.delta={event.delta.args_delta}')
+            elif isinstance(event, FinalResultEvent):
+                output_messages.append(
+                    f'[Result] The model produced a final result (tool_name={event.tool_name}'
+                )
+                # await msg.stream_token(f'[Result] The model produced a final result (tool_name={event.tool_name}')
+            elif isinstance(event, FunctionToolCallEvent):
+                output_messages.append(
+                    f'[Tools] The LLM calls tool={event.part.tool_name!r} with args={event.part.args} (tool_call_id={event.part.tool_call_id!r}'
+                )
+                # await msg.stream_token(f'[Tools] The LLM calls tool={event.part.tool_name!r} with args={event.part.args} (tool_call_id={event.part.tool_call_id!r}')
+            elif isinstance(event, FunctionToolResultEvent):
+                output_messages.append(
+                    f'[Tools] Tool call {event.tool_call_id!r} returned => {event.result.content}'
+                )
+                # await msg.stream_token(f'[Tools] Tool call {event.tool_call_id!r} returned => {event.result.content}')
 
-    PRESENTATION_ID = cl.user_session.get("presentation_id")
-    target_layout = [slide.layout for slide in final_result.slides]
-    curr_template = ["cover", "table content", "only text", "text, image 25%", "text and image equal, 50%-50%",
-                "image, text 25%", "only image", "text and 4 images", "text and 2 images", "graph", "video",
-                "closing"]
-    task3 = cl.Task(title="Deleting unnecessary slide from the presentation", status=cl.TaskStatus.RUNNING)
-    task4 = cl.Task(title="Duplicate slides from the presentation", status=cl.TaskStatus.RUNNING)
-    task5 = cl.Task(title="Move slides to appropriate position", status=cl.TaskStatus.RUNNING)
+        agent_started = time.perf_counter()
+        # The shared generation path: a cached result for the same content, prompt and
+        # settings, or a run on the condensed source with preselected images, accounted
+        final_result = await generate_presentation_async(
+            deps, on_node=on_node, on_event=on_event, session_id=cl.user_session.get("id")
+        )
+        METRICS.observe("agent.run", time.perf_counter() - agent_started)
 
-    await task_list.add_task(task2)
-    await task_list.add_task(task3)
-    await task_list.send()
+        if nodes:
+            output_messages.append(f'=== Final Agent Output: {final_result} ===')
+        else:
+            output_messages.append('=== Cached Agent Output ===')
+        await stream_presentation(msg, final_result)
 
-    # Delete unnecessary slides
-    curr_template = delete_unnecessary_slide(PRESENTATION_ID, target_layout, curr_template)
-    task3.status = cl.TaskStatus.DONE
-    await task_list.add_task(task4)
-    await task_list.send()
+        message_history.append({"role": "assistant", "content": msg.content})
+        await msg.update()
 
+        finish_task(task1, task1_started, run_metrics)
+        await task_list.send()
 
-    # Duplicate slides
-    curr_template = copy_slide(PRESENTATION_ID, target_layout, curr_template)
-    task4.status = cl.TaskStatus.DONE
-    await task_list.add_task(task5)
+        # Write what the stream didn't deliver and drop the template slides
+        await writer.finish(final_result.slides)
+    finally:
+        await writer.close()
+    finish_task(task2, task2_started, run_metrics)
     await task_list.send()
 
-    # Move slides to the appropriate position
-    curr_template = move_slide(PRESENTATION_ID, target_layout, curr_template)
-    assert curr_template == target_layout
-    task5.status = cl.TaskStatus.DONE
-    task2.status = cl.TaskStatus.DONE
+    task3 = cl.Task(title="Render slide thumbnails", status=cl.TaskStatus.RUNNING)
+    task3_started = start_task(run_metrics)
+    await task_list.add_task(task3)
     await task_list.send()
 
+    thumbnail_paths = await generate_deck_thumbnails_async(
+        PRESENTATION_ID, os.path.join(THUMBNAIL_DIR, PRESENTATION_ID), snapshot, cache=thumbnail_cache
+    )
 
-    task6 = cl.Task(title="Update content of the presentation", status=cl.TaskStatus.RUNNING)
-    await task_list.add_task(task6)
+    finish_task(task3, task3_started, run_metrics)
+    task_list.status = "Done"
     await task_list.send()
 
-    update_presentation_content(PRESENTATION_ID, final_result.slides)
-
-    task6.status = cl.TaskStatus.DONE
-    await task_list.send()
+    run_metrics.write_json_lines(METRICS_PATH, session_id=cl.user_session.get("id"), presentation_id=PRESENTATION_ID)
 
-    thumbnails = [cl.Image(name = f"{i}", path=f"./thumbnail/{i}.png", display="inline") for i in range(17)]
+    thumbnails = [cl.Image(name = f"{i}", path=path, display="inline") for i, path in enumerate(thumbnail_paths)]
 
     # Sending an action button within a chatbot message
     actions = [
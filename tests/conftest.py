@@ -0,0 +1,46 @@
+import asyncio
+from types import SimpleNamespace
+import httpx
+import pytest
+from slide_agent.async_slide_ops import SLIDES_API_URL, AsyncSlidesClient
+from slide_agent.run_accounting import RunAccount
+from slide_agent.util import SLIDES_READ_LIMITER, SLIDES_WRITE_LIMITER
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limits(monkeypatch):
+    # The fake API has no quota; don't wait for the client-side limiters
+    monkeypatch.setattr(SLIDES_READ_LIMITER, "enabled", False)
+    monkeypatch.setattr(SLIDES_WRITE_LIMITER, "enabled", False)
+
+
+@pytest.fixture(autouse=True)
+def runs_path(tmp_path, monkeypatch):
+    # Run records (summaries, generations) go to a scratch file, not the working directory
+    path = tmp_path / "runs.jsonl"
+    write_json_lines = RunAccount.write_json_lines
+    monkeypatch.setattr(RunAccount, "write_json_lines", lambda self, _=None: write_json_lines(self, path))
+    return path
+
+
+@pytest.fixture
+def slides_client():
+    # `slides_client(service)`: an AsyncSlidesClient talking to a FakeSlidesService.
+    # Make one per asyncio.run(); all of them are closed after the test.
+    clients = []
+
+    def make(service):
+        client = AsyncSlidesClient(
+            creds=SimpleNamespace(valid=True, expiry=None, token="token"),
+            http_client=httpx.AsyncClient(transport=service.as_httpx_transport(), base_url=SLIDES_API_URL),
+        )
+        clients.append(client)
+        return client
+
+    yield make
+
+    async def close():
+        for client in clients:
+            await client.aclose()
+
+    asyncio.run(close())
@@ -0,0 +1,31 @@
+import json
+import pytest
+from batch import load_manifest
+
+
+def write_manifest(path, jobs):
+    path.write_text("".join(json.dumps(job) + "\n" for job in jobs))
+    return str(path)
+
+
+def test_jobs_get_ids(tmp_path):
+    jobs = load_manifest(write_manifest(tmp_path / "jobs.jsonl", [
+        {"source": "a.txt", "presentation_id": "deck-a"},
+        {"id": "second", "source": "b.txt", "presentation_id": "deck-b"},
+    ]))
+
+    assert [job["id"] for job in jobs] == ["0", "second"]
+
+
+def test_jobs_need_source_and_presentation(tmp_path):
+    with pytest.raises(ValueError, match="needs"):
+        load_manifest(write_manifest(tmp_path / "jobs.jsonl", [{"source": "a.txt"}]))
+
+
+def test_jobs_cannot_share_a_deck(tmp_path):
+    url = "https://docs.google.com/presentation/d/deck-a/edit"
+    with pytest.raises(ValueError, match="same presentation deck-a"):
+        load_manifest(write_manifest(tmp_path / "jobs.jsonl", [
+            {"id": "one", "source": "a.txt", "presentation_id": "deck-a"},
+            {"id": "two", "source": "b.txt", "presentation_id": url},
+        ]))
@@ -0,0 +1,125 @@
+import asyncio
+import json
+from dataclasses import replace
+from types import SimpleNamespace
+import pytest
+from PIL import Image
+from pydantic_ai.models.test import TestModel
+from slide_agent import image_utils, slide_gen, sqlite_cache
+from slide_agent.caption_cache import CaptionCache, caption_key
+from slide_agent.presentation_model import Content, Presentation
+from slide_agent.run_cache import RunCache, run_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1_000_000.0)
+    monkeypatch.setattr(sqlite_cache, "time", SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def test_key_covers_bytes_prompt_and_model():
+    key = caption_key(b"image", "prompt", "model")
+
+    assert key == caption_key(b"image", "prompt", "model")
+    assert key != caption_key(b"other", "prompt", "model")
+    assert key != caption_key(b"image", "other prompt", "model")
+    assert key != caption_key(b"image", "prompt", "other-model")
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = CaptionCache(":memory:", ttl=60)
+    cache.put("key", "caption", 640, 480)
+
+    clock.now += 59
+    assert cache.get("key") == ("caption", 640, 480)
+
+    clock.now += 2
+    assert cache.get("key") is None
+    assert cache.evict() == 0
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_evict_keeps_most_recently_used(clock):
+    cache = CaptionCache(":memory:", ttl=None, max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, key, 1, 1)
+        clock.now += 1
+    cache.get("a")
+
+    assert cache.evict() == 2
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_describe_image_skips_the_model_on_a_hit(tmp_path, monkeypatch):
+    path = tmp_path / "figure.png"
+    Image.new("RGB", (64, 32), "white").save(path)
+
+    calls = []
+    monkeypatch.setattr(image_utils, "caption_image", lambda image: calls.append(image.size) or "A white figure")
+    cache = CaptionCache(":memory:")
+
+    assert image_utils.describe_image(str(path), cache) == (64, 32, "A white figure")
+    assert image_utils.describe_image(str(path), cache) == (64, 32, "A white figure")
+    assert calls == [(64, 32)]
+
+    # Other bytes under the same name are another entry
+    Image.new("RGB", (64, 32), "black").save(path)
+    image_utils.describe_image(str(path), cache)
+    assert len(calls) == 2
+
+
+def test_puts_evict_on_a_cadence(clock, monkeypatch):
+    monkeypatch.setattr(RunCache, "evict_every", 3)
+    cache = RunCache(":memory:", ttl=None, max_entries=2)
+    for key in ("a", "b"):
+        cache.put(key, key)
+        clock.now += 1
+
+    # The third put is due: only the two most recently used are left
+    cache.put("c", "c")
+    assert cache.get("a") is None
+    assert cache.get("b") == "b"
+    assert cache.get("c") == "c"
+
+
+def test_expired_entries_are_purged_on_open(tmp_path, clock):
+    path = str(tmp_path / "runs.sqlite3")
+    cache = RunCache(path, ttl=60)
+    cache.put("key", "{}")
+    cache.close()
+
+    clock.now += 61
+    assert RunCache(path, ttl=60).evict() == 0
+    assert RunCache(path, ttl=None).get("key") is None
+
+
+def test_run_key_covers_prompt_model_settings_and_schema():
+    key = run_key("prompt", "model", {"temperature": 0.0}, {"type": "object"})
+
+    assert key == run_key("prompt", "model", {"temperature": 0.0}, {"type": "object"})
+    assert key != run_key("other prompt", "model", {"temperature": 0.0}, {"type": "object"})
+    assert key != run_key("prompt", "other-model", {"temperature": 0.0}, {"type": "object"})
+    assert key != run_key("prompt", "model", {"temperature": 0.5}, {"type": "object"})
+    assert key != run_key("prompt", "model", {"temperature": 0.0}, {"type": "array"})
+
+
+def test_generation_reuses_results_until_the_input_changes(runs_path):
+    cache = RunCache(":memory:")
+    model = TestModel()
+    deps = Content(title="Attention", content="# Attention\nScaled dot-product attention.", images=[],
+                   language="English")
+
+    async def generate(deps):
+        with slide_gen.slide_gen_agent.override(model=model):
+            return await slide_gen.generate_presentation_async(deps, cache)
+
+    first = asyncio.run(generate(deps))
+    assert isinstance(first, Presentation)
+    assert asyncio.run(generate(deps)) == first
+    asyncio.run(generate(replace(deps, title="Transformers")))
+
+    runs = [json.loads(line) for line in runs_path.read_text().splitlines()]
+    assert [run["cached"] for run in runs] == [False, True, False]
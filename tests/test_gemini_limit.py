@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from PIL import Image
+from slide_agent import image_utils, summarizer
+from slide_agent.presentation_model import SectionSummary
+from slide_agent.run_cache import RunCache
+
+
+class InFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = 0
+        self.peak = 0
+
+    def __enter__(self):
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.current -= 1
+
+
+def test_captions_and_summaries_share_one_limit(monkeypatch):
+    monkeypatch.setattr(image_utils, "_gemini_slots", image_utils._gemini_slots)
+    image_utils.set_concurrency(gemini=2)
+    calls = InFlight()
+
+    def generate_content(**kwargs):
+        with calls:
+            time.sleep(0.05)
+        return SimpleNamespace(text="A caption")
+
+    async def run(prompt):
+        with calls:
+            await asyncio.sleep(0.05)
+        return SimpleNamespace(data=SectionSummary(heading=prompt, points=[]), usage=lambda: None)
+
+    client = SimpleNamespace(models=SimpleNamespace(generate_content=generate_content))
+    monkeypatch.setattr(image_utils, "get_genai_client", lambda: client)
+    monkeypatch.setattr(summarizer.summarizer_agent, "run", run)
+
+    async def main():
+        cache = RunCache(":memory:")
+        image = Image.new("RGB", (8, 8))
+        await asyncio.gather(
+            *(asyncio.to_thread(image_utils.caption_image, image) for _ in range(6)),
+            *(summarizer.summarize_chunk(f"Section {i}", cache, image_utils.gemini_slots()) for i in range(6)),
+        )
+
+    asyncio.run(main())
+
+    assert calls.peak == 2
@@ -0,0 +1,67 @@
+from slide_agent.image_index import ImageIndex, preselect_images
+from slide_agent.presentation_model import Content, ImageData
+
+
+def image(name, caption):
+    return ImageData(image_url=f"https://bucket/{name}.png", caption=caption, width=640, height=480)
+
+
+IMAGES = [
+    image("bleu", "BLEU scores of translation models plotted against sentence length"),
+    image("attention", "Attention weights heatmap aligning source and target words"),
+    image("architecture", "Encoder decoder architecture with recurrent layers"),
+    image("training", "Training loss curves over epochs for each learning rate"),
+]
+
+CONTENT = (
+    "# Results\nBLEU scores drop as sentence length grows for every translation model.\n"
+    "-----\n"
+    "# Alignment\nThe attention weights align target words with source words.\n"
+    "-----\n"
+    "# Model\nAn encoder and a decoder built from recurrent layers."
+)
+
+
+def urls(images):
+    return [image.image_url for image in images]
+
+
+def test_query_ranks_the_matching_caption_first():
+    index = ImageIndex(IMAGES)
+
+    matches = index.query("attention heatmap of source words", k=2)
+
+    assert urls(image for _, image in matches)[0] == "https://bucket/attention.png"
+    assert len(matches) <= 2
+    assert [score for score, _ in matches] == sorted((score for score, _ in matches), reverse=True)
+
+
+def test_query_drops_images_below_the_threshold():
+    assert ImageIndex(IMAGES).query("quantum chromodynamics") == []
+    assert ImageIndex([]).query("anything") == []
+
+
+def test_each_section_gets_its_top_images():
+    deps = Content(title="Attention", content=CONTENT, images=IMAGES, language="English")
+
+    selected = preselect_images(deps, k=1)
+
+    assert urls(selected.images) == ["https://bucket/bleu.png", "https://bucket/attention.png",
+                                     "https://bucket/architecture.png"]
+    sections = selected.content.split("\n-----\n")
+    assert sections[0].endswith("[Candidate images: https://bucket/bleu.png]")
+    assert sections[1].endswith("[Candidate images: https://bucket/attention.png]")
+    assert sections[2].endswith("[Candidate images: https://bucket/architecture.png]")
+
+
+def test_no_match_keeps_every_image():
+    deps = Content(title="Physik", content="# Ergebnisse\nDie Quarks bleiben gebunden.", images=IMAGES,
+                   language="German")
+
+    assert preselect_images(deps, k=1) is deps
+
+
+def test_few_images_are_kept_as_they_are():
+    deps = Content(title="Attention", content=CONTENT, images=IMAGES[:2], language="English")
+
+    assert preselect_images(deps, k=2) is deps
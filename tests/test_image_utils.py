@@ -0,0 +1,65 @@
+import boto3
+from botocore.stub import Stubber
+from PIL import Image
+from slide_agent import image_utils
+
+
+def make_images(tmp_path, sizes):
+    paths = []
+    for i, size in enumerate(sizes):
+        path = tmp_path / f"{i}.png"
+        Image.new("RGB", size, (i, i, i)).save(path)
+        paths.append(str(path))
+
+    return paths
+
+
+def test_caption_batches_skip_unreadable_files(tmp_path):
+    paths = make_images(tmp_path, [(64, 64), (64, 64)])
+    corrupt = tmp_path / "corrupt.png"
+    corrupt.write_bytes(b"not an image")
+
+    batches = image_utils.plan_caption_batches([paths[0], str(corrupt), paths[1]])
+
+    assert batches == [paths]
+
+
+def test_caption_batches_respect_the_budgets(tmp_path):
+    paths = make_images(tmp_path, [(64, 64)] * 5)
+
+    assert image_utils.plan_caption_batches(paths, input_tokens=3 * 258) == [paths[:3], paths[3:]]
+    assert image_utils.plan_caption_batches(paths, max_images=2) == [paths[:2], paths[2:4], paths[4:]]
+
+
+def test_one_bad_file_drops_out_of_ingestion(tmp_path, monkeypatch):
+    paths = make_images(tmp_path, [(64, 64), (32, 32)])
+    (tmp_path / "2.png").write_bytes(b"not an image")
+
+    monkeypatch.setattr(image_utils, "describe_images",
+                        lambda batch, cache=None: {path: (1, 1, f"caption of {path}") for path in batch})
+    monkeypatch.setattr(image_utils, "upload_image", lambda path, max_size: (f"https://bucket/{path}", (1, 1)))
+
+    images = list(image_utils.ingest_images(str(tmp_path)))
+
+    assert sorted(image.image_url for image in images) == [f"https://bucket/{path}" for path in paths]
+
+
+def test_resized_uploads_share_one_transfer_manager(tmp_path, monkeypatch):
+    paths = make_images(tmp_path, [(64, 64), (32, 32)])
+    client = boto3.client("s3", region_name="us-east-1", aws_access_key_id="key", aws_secret_access_key="secret")
+    monkeypatch.setattr(image_utils, "_s3_client", client)
+    monkeypatch.setattr(image_utils, "_s3_transfer_manager", None)
+    monkeypatch.setattr(image_utils, "ensure_bucket", lambda *args: None)
+
+    with Stubber(client) as stubber:
+        for _ in paths:
+            stubber.add_client_error("head_object", "404")
+            stubber.add_response("put_object", {})
+
+        for path in paths:
+            url, size = image_utils.upload_image(path, max_size=(16, 16))
+            assert url.startswith(f"https://{image_utils.BUCKET_NAME}.s3.amazonaws.com/image/")
+            assert size == (16, 16)
+        stubber.assert_no_pending_responses()
+
+    assert image_utils.get_s3_transfer_manager() is image_utils.get_s3_transfer_manager()
@@ -0,0 +1,87 @@
+from slide_agent.fake_slides import FakeSlidesService, make_template_presentation
+from slide_agent.presentation_snapshot import PresentationSnapshot, iter_page_elements
+from slide_agent.slide_planner import new_object_id
+
+
+def object_tree(presentation):
+    # What SlideOps reads from a snapshot: slide order and the elements of every slide
+    return [
+        (slide["objectId"], sorted(element["objectId"] for element in iter_page_elements(slide.get("pageElements", []))))
+        for slide in presentation["slides"]
+    ]
+
+
+def make_snapshot():
+    service = FakeSlidesService([make_template_presentation("deck")])
+    snapshot = PresentationSnapshot("deck", service=service)
+    snapshot.refresh()
+    return service, snapshot
+
+
+def server_tree(service):
+    return object_tree(service.presentations().get(presentationId="deck").execute())
+
+
+def test_replayed_replies_match_the_server():
+    service, snapshot = make_snapshot()
+    first, second, last = snapshot.slides[0], snapshot.slides[1], snapshot.slides[-1]
+
+    object_ids = {first["objectId"]: new_object_id()}
+    for element in iter_page_elements(first["pageElements"]):
+        object_ids[element["objectId"]] = new_object_id()
+    copy_id = object_ids[first["objectId"]]
+
+    snapshot.batch_update([
+        {"duplicateObject": {"objectId": first["objectId"], "objectIds": object_ids}},
+        {"updateSlidesPosition": {"slideObjectIds": [copy_id], "insertionIndex": len(snapshot.slides) + 1}},
+        {"updateSlidesPosition": {"slideObjectIds": [last["objectId"]], "insertionIndex": 0}},
+        {"deleteObject": {"objectId": second["objectId"]}},
+        {"insertText": {"objectId": object_ids[first["pageElements"][0]["objectId"]], "text": "Title"}},
+        {
+            "createImage": {
+                "objectId": "image_1",
+                "url": "https://example.com/a.png",
+                "elementProperties": {"pageObjectId": copy_id},
+            }
+        },
+        {
+            "createTable": {
+                "objectId": "table_1",
+                "rows": 2,
+                "columns": 3,
+                "elementProperties": {"pageObjectId": first["objectId"]},
+            }
+        },
+    ])
+
+    assert not snapshot.is_stale
+    assert service.calls["presentations.get"] == 1
+    assert object_tree(snapshot.presentation) == server_tree(service)
+
+
+def test_moves_count_insertion_index_before_the_move():
+    service, snapshot = make_snapshot()
+    ids = [slide["objectId"] for slide in snapshot.slides]
+
+    snapshot.batch_update([
+        {"updateSlidesPosition": {"slideObjectIds": [ids[0]], "insertionIndex": 3}},
+        {"updateSlidesPosition": {"slideObjectIds": [ids[5], ids[2]], "insertionIndex": 1}},
+    ])
+
+    assert object_tree(snapshot.presentation) == server_tree(service)
+
+
+def test_duplicate_without_element_ids_drops_the_snapshot():
+    # The server picks the copy's element ids, which the reply doesn't list
+    service, snapshot = make_snapshot()
+    snapshot.batch_update([{"duplicateObject": {"objectId": snapshot.slides[0]["objectId"]}}])
+
+    assert snapshot.is_stale
+    assert object_tree(snapshot.presentation) == server_tree(service)
+
+
+def test_unknown_request_drops_the_snapshot():
+    service, snapshot = make_snapshot()
+    snapshot.apply_replies([{"groupObjects": {"childrenObjectIds": []}}], {})
+
+    assert snapshot.is_stale
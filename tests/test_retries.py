@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from googleapiclient.errors import HttpError
+from slide_agent import util
+from slide_agent.fake_slides import FakeSlidesService, make_template_presentation
+from slide_agent.presentation_snapshot import PresentationSnapshot
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(util, "BASE_DELAY", 0.0)
+
+
+def failing_service(status):
+    return FakeSlidesService([make_template_presentation("deck")], error_rate=1.0, error_status=status, retry_after=0)
+
+
+def test_reads_are_retried_on_server_errors():
+    service = failing_service(503)
+
+    with pytest.raises(HttpError):
+        PresentationSnapshot("deck", service=service).refresh()
+
+    assert service.calls["presentations.get"] == util.MAX_RETRIES + 1
+
+
+@pytest.mark.parametrize("status", [500, 503])
+def test_writes_are_not_retried_on_server_errors(status):
+    # The update may have been applied before the error; sending it again could apply it twice
+    service = failing_service(status)
+
+    with pytest.raises(HttpError):
+        PresentationSnapshot("deck", service=service).batch_update([{"deleteObject": {"objectId": "page_0000"}}])
+
+    assert service.calls["presentations.batchUpdate"] == 1
+
+
+def test_writes_are_retried_on_quota_errors():
+    service = failing_service(429)
+
+    with pytest.raises(HttpError):
+        PresentationSnapshot("deck", service=service).batch_update([{"deleteObject": {"objectId": "page_0000"}}])
+
+    assert service.calls["presentations.batchUpdate"] == util.MAX_RETRIES + 1
+
+
+def test_async_writes_are_not_retried_on_server_errors(slides_client):
+    service = failing_service(503)
+    client = slides_client(service)
+
+    async def run():
+        with pytest.raises(Exception):
+            await client.batch_update("deck", [{"deleteObject": {"objectId": "page_0000"}}])
+        with pytest.raises(Exception):
+            await client.get_presentation("deck")
+
+    asyncio.run(run())
+
+    assert service.calls["presentations.batchUpdate"] == 1
+    assert service.calls["presentations.get"] == util.MAX_RETRIES + 1
@@ -0,0 +1,88 @@
+import json
+from types import SimpleNamespace
+import pytest
+from pydantic_ai.usage import Usage
+from slide_agent import run_accounting
+from slide_agent.run_accounting import RunAccount, aggregate, estimate_tokens
+
+MODEL = "google-gla:gemini-2.0-flash"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=100.0)
+    monkeypatch.setattr(run_accounting, "time", SimpleNamespace(perf_counter=lambda: clock.now, time=lambda: 0.0))
+    return clock
+
+
+def test_as_dict_of_a_run(clock):
+    account = RunAccount(MODEL, "x" * 40, session_id="s1")
+    clock.now += 0.5
+    account.first_token()
+    clock.now += 1.0
+    account.begin_validation()
+    clock.now += 0.5
+    account.finish(Usage(requests=1, request_tokens=1000, response_tokens=500))
+
+    record = account.as_dict()
+
+    assert record["session_id"] == "s1"
+    assert record["model"] == MODEL
+    assert record["cached"] is False
+    assert record["requests"] == 1
+    assert (record["prompt_chars"], record["prompt_tokens_estimate"]) == (40, 10)
+    assert (record["prompt_tokens"], record["output_tokens"]) == (1000, 500)
+    assert record["time_to_first_token"] == 0.5
+    assert record["total_seconds"] == 2.0
+    assert record["validation_seconds"] == 0.5
+    assert record["validation_share"] == 0.25
+    assert record["cost_usd"] == pytest.approx((1000 * 0.10 + 500 * 0.40) / 1e6)
+
+
+def test_cached_runs_cost_nothing():
+    record = RunAccount(MODEL, "prompt", cached=True).finish().as_dict()
+
+    assert record["requests"] == 0
+    assert record["cost_usd"] is None
+    assert record["prompt_tokens"] is None
+
+
+def test_unknown_model_has_no_cost():
+    record = RunAccount("other:model", "prompt").finish(Usage(requests=1, request_tokens=10)).as_dict()
+
+    assert record["cost_usd"] is None
+
+
+def test_write_json_lines_appends(tmp_path):
+    path = tmp_path / "runs.jsonl"
+
+    first = RunAccount(MODEL, "prompt").finish().write_json_lines(path)
+    RunAccount(MODEL, "prompt", cached=True).finish().write_json_lines(path)
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record["cached"] for record in records] == [False, True]
+    assert records[0] == first
+
+
+def test_aggregate_per_model_and_stage(tmp_path):
+    path = tmp_path / "runs.jsonl"
+    for tokens in (100, 200, 300):
+        RunAccount(MODEL, "p", stage="summarize").finish(Usage(requests=1, request_tokens=tokens)).write_json_lines(path)
+    RunAccount(MODEL, "p", cached=True, stage="summarize").finish().write_json_lines(path)
+    RunAccount(MODEL, "p" * 8, stage="generate").finish(Usage(requests=1, request_tokens=50)).write_json_lines(path)
+    RunAccount("other:model", "p").finish().write_json_lines(path)
+
+    summaries = aggregate(path)
+
+    assert sorted(summaries) == ["google-gla:gemini-2.0-flash / generate", "google-gla:gemini-2.0-flash / summarize",
+                                 "other:model"]
+    summarize = summaries["google-gla:gemini-2.0-flash / summarize"]
+    assert (summarize["runs"], summarize["cached"]) == (4, 1)
+    assert summarize["prompt_tokens"] == {"mean": 200, "p50": 200, "p95": 300, "max": 300}
+    assert summarize["cost_usd"] == pytest.approx(600 * 0.10 / 1e6)
+    assert summaries["google-gla:gemini-2.0-flash / generate"]["prompt_chars"]["max"] == 8
+    assert summaries["other:model"]["prompt_tokens"]["mean"] is None
+
+
+def test_estimate_tokens_rounds_up():
+    assert [estimate_tokens("x" * n) for n in (0, 1, 4, 5)] == [0, 1, 1, 2]
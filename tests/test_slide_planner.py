@@ -0,0 +1,88 @@
+import random
+import pytest
+from slide_agent.fake_slides import FakeSlidesService, make_template_presentation, slide_layouts
+from slide_agent.slide_planner import (
+    assign_target_positions,
+    longest_increasing_subsequence,
+    plan_slide_moves,
+    plan_template_restructure,
+)
+
+
+def apply_moves(layouts, target):
+    # Send the planned moves to the fake API; returns the layouts in the resulting order
+    service = FakeSlidesService([make_template_presentation("deck", layouts=layouts)])
+    ids = [slide["objectId"] for slide in service.presentations().get(presentationId="deck").execute()["slides"]]
+    layout_of = dict(zip(ids, layouts))
+
+    requests = plan_slide_moves(ids, layouts, target)
+    if requests:
+        service.presentations().batchUpdate(presentationId="deck", body={"requests": requests}).execute()
+
+    slides = service.presentations().get(presentationId="deck").execute()["slides"]
+    return [layout_of[slide["objectId"]] for slide in slides], requests
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_moves_reach_the_target_order(seed):
+    rng = random.Random(seed)
+    layouts = [rng.choice("abcde") for _ in range(rng.randint(1, 12))]
+    target = rng.sample(layouts, len(layouts))
+
+    order, requests = apply_moves(layouts, target)
+
+    assert order == target
+    # Every slide off the longest increasing subsequence moves once, the rest stay
+    kept = longest_increasing_subsequence(assign_target_positions(layouts, target))
+    assert len(requests) <= len(layouts) - len(kept)
+
+
+def test_sorted_deck_needs_no_moves():
+    assert apply_moves(list("abc"), list("abc")) == (list("abc"), [])
+
+
+def test_reversed_deck():
+    order, requests = apply_moves(list("abcd"), list("dcba"))
+
+    assert order == list("dcba")
+    assert len(requests) == 3
+
+
+def test_different_layouts_are_rejected():
+    with pytest.raises(ValueError):
+        plan_slide_moves(["s1", "s2"], ["a", "b"], ["a", "c"])
+
+
+def test_longest_increasing_subsequence():
+    seq = [3, 1, 4, 1, 5, 9, 2, 6]
+    indexes = longest_increasing_subsequence(seq)
+
+    assert len(indexes) == 4
+    assert all(seq[i] < seq[j] for i, j in zip(indexes, indexes[1:]))
+
+
+
+def restructure(layouts, target):
+    # Send the planned restructure to the fake API; returns the layouts of the resulting deck
+    service = FakeSlidesService([make_template_presentation("deck", layouts=layouts)])
+    slides = service.presentations().get(presentationId="deck").execute()["slides"]
+
+    requests = plan_template_restructure(slides, layouts, target)
+    if requests:
+        service.presentations().batchUpdate(presentationId="deck", body={"requests": requests}).execute()
+
+    return slide_layouts(service.presentations().get(presentationId="deck").execute())
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_restructure_reaches_the_target_deck(seed):
+    rng = random.Random(seed)
+    layouts = [rng.choice("abcde") for _ in range(rng.randint(1, 10))]
+    target = [rng.choice(layouts) for _ in range(rng.randint(1, 15))]
+
+    assert restructure(layouts, target) == target
+
+
+def test_restructure_rejects_missing_layouts():
+    with pytest.raises(ValueError):
+        restructure(list("ab"), list("abc"))
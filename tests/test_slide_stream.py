@@ -0,0 +1,219 @@
+import asyncio
+import json
+import random
+import pytest
+from pydantic_ai.messages import PartDeltaEvent, PartStartEvent, ToolCallPart, ToolCallPartDelta
+from pydantic_ai.models.test import TestModel
+from slide_agent import slide_gen
+from slide_agent.async_slide_ops import AsyncPresentationSnapshot
+from slide_agent.fake_slides import FakeSlidesService, make_template_presentation
+from slide_agent.presentation_model import Content, Presentation, Slide
+from slide_agent.run_cache import RunCache
+from slide_agent.slide_stream import IncrementalDeckWriter, SlideStreamParser
+
+
+def make_slide(page, layout, image_urls=None):
+    return {
+        "title": f"Slide {page}: \"quoted\", {{braces}} and [brackets]",
+        "body_text": {"subject": "Subject", "points": ["a, b", "c}]\\"]},
+        "layout": layout,
+        "image_urls": image_urls,
+        "page": page,
+    }
+
+
+PRESENTATION = {
+    "title": "Attention",
+    "slides": [
+        make_slide(0, "cover"),
+        make_slide(1, "only text"),
+        make_slide(2, "only image", ["https://example.com/1.png"]),
+        make_slide(3, "closing"),
+    ],
+}
+
+
+def feed_in_chunks(text, sizes):
+    parser = SlideStreamParser()
+    slides, pos = [], 0
+    while pos < len(text):
+        size = next(sizes)
+        slides += parser.feed(text[pos:pos + size])
+        pos += size
+
+    return slides
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10_000])
+def test_fixed_chunks(size):
+    text = json.dumps(PRESENTATION)
+    sizes = iter(lambda: size, None)
+
+    assert feed_in_chunks(text, sizes) == PRESENTATION["slides"]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_random_chunks(seed):
+    rng = random.Random(seed)
+    text = json.dumps(PRESENTATION, indent=rng.choice([None, 2]))
+    sizes = iter(lambda: rng.randint(1, 20), None)
+
+    assert feed_in_chunks(text, sizes) == PRESENTATION["slides"]
+
+
+def test_slides_are_emitted_as_soon_as_they_close():
+    text = json.dumps(PRESENTATION)
+    first_end = text.index(json.dumps(PRESENTATION["slides"][0])) + len(json.dumps(PRESENTATION["slides"][0]))
+    parser = SlideStreamParser()
+
+    assert parser.feed(text[:first_end - 1]) == []
+    assert parser.feed(text[first_end - 1:first_end]) == PRESENTATION["slides"][:1]
+
+
+def test_nested_slides_key_is_ignored():
+    text = json.dumps({"title": "x", "meta": {"slides": [{"a": 1}]}, "slides": [{"b": 2}]})
+
+    assert SlideStreamParser().feed(text) == [{"b": 2}]
+
+
+def test_dict_arguments():
+    # Providers that send the whole call at once: only slides not seen before come out
+    parser = SlideStreamParser()
+
+    assert parser.feed({"slides": PRESENTATION["slides"][:2]}) == PRESENTATION["slides"][:2]
+    assert parser.feed(PRESENTATION) == PRESENTATION["slides"][2:]
+
+
+def test_reset_starts_a_new_call():
+    text = json.dumps(PRESENTATION)
+    parser = SlideStreamParser()
+    parser.feed(text[:len(text) // 2])
+    parser.reset()
+
+    assert parser.feed(text) == PRESENTATION["slides"]
+
+
+def deck_ids(service):
+    return [slide["objectId"] for slide in service.presentations().get(presentationId="deck").execute()["slides"]]
+
+
+def run_writer(client, scenario, flaky_batch=None):
+    # Runs `scenario(writer)` on the deck behind `client`, closing the writer however it ends.
+    # With `flaky_batch`, that batchUpdate call (1-based) fails.
+    async def run():
+        if flaky_batch is not None:
+            batch_update, calls = client.batch_update, []
+
+            async def flaky(presentation_id, requests):
+                calls.append(requests)
+                if len(calls) == flaky_batch:
+                    raise RuntimeError("injected failure")
+                return await batch_update(presentation_id, requests)
+
+            client.batch_update = flaky
+
+        writer = IncrementalDeckWriter("deck", AsyncPresentationSnapshot("deck", client))
+        await writer.start()
+        try:
+            return await scenario(writer)
+        finally:
+            await writer.close()
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def service():
+    return FakeSlidesService([make_template_presentation("deck")])
+
+
+TEMPLATE_IDS = [slide["objectId"] for slide in make_template_presentation("deck")["slides"]]
+SLIDES = Presentation.model_validate(PRESENTATION).slides
+
+
+def test_writer_replaces_the_template(service, slides_client):
+    async def scenario(writer):
+        for slide in SLIDES[:2]:
+            writer.submit(slide)
+            await asyncio.sleep(0)
+        return await writer.finish(SLIDES)
+
+    slide_ids = run_writer(slides_client(service), scenario)
+
+    assert deck_ids(service) == slide_ids
+    assert len(slide_ids) == len(SLIDES)
+
+
+def test_writer_rewrites_the_deck_after_a_failed_batch(service, slides_client):
+    async def scenario(writer):
+        writer.submit(SLIDES[0])
+        await asyncio.sleep(0.01)
+        writer.submit(SLIDES[1])
+        await asyncio.sleep(0.01)
+
+        # The second batch failed: submitting fails too, finish() starts over
+        with pytest.raises(RuntimeError):
+            writer.submit(SLIDES[2])
+        return await writer.finish(SLIDES)
+
+    slide_ids = run_writer(slides_client(service), scenario, flaky_batch=2)
+
+    assert deck_ids(service) == slide_ids
+    assert len(slide_ids) == len(SLIDES)
+
+
+def test_close_removes_a_half_written_deck(service, slides_client):
+    async def scenario(writer):
+        writer.submit(SLIDES[0])
+        writer.submit(SLIDES[1])
+        await asyncio.sleep(0.01)
+        raise ConnectionError("the agent run failed")
+
+    with pytest.raises(ConnectionError):
+        run_writer(slides_client(service), scenario)
+
+    assert deck_ids(service) == TEMPLATE_IDS
+
+
+def test_failed_finish_leaves_the_template(service, slides_client):
+    async def scenario(writer):
+        writer.submit(SLIDES[0])
+        await asyncio.sleep(0.01)
+
+        slides = [slide.model_copy() for slide in SLIDES]
+        slides[1].layout = "no such layout"
+        with pytest.raises(ValueError):
+            await writer.finish(slides)
+
+    run_writer(slides_client(service), scenario)
+
+    assert deck_ids(service) == TEMPLATE_IDS
+
+
+def test_generation_callbacks_see_the_streamed_slides():
+    # stream.py's wiring: result tool call parts go to the parser as they stream in
+    cache = RunCache(":memory:")
+    deps = Content(title="Attention", content="# Attention\nScaled dot-product attention.", images=[],
+                   language="English")
+    nodes, streamed = [], []
+    parser = SlideStreamParser()
+
+    def on_event(event):
+        if isinstance(event, PartStartEvent) and isinstance(event.part, ToolCallPart):
+            parser.reset()
+            streamed[:] = parser.feed(event.part.args)
+        elif isinstance(event, PartDeltaEvent) and isinstance(event.delta, ToolCallPartDelta):
+            streamed.extend(parser.feed(event.delta.args_delta))
+
+    async def generate():
+        with slide_gen.slide_gen_agent.override(model=TestModel()):
+            return await slide_gen.generate_presentation_async(deps, cache, on_node=nodes.append, on_event=on_event)
+
+    presentation = asyncio.run(generate())
+    assert nodes
+    assert [Slide.model_validate(item) for item in streamed] == presentation.slides
+
+    # A cached result runs no node
+    nodes.clear()
+    assert asyncio.run(generate()) == presentation
+    assert nodes == []
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import pytest
+from pydantic_ai.models.test import TestModel
+from slide_agent import summarizer
+from slide_agent.presentation_model import SectionSummary
+from slide_agent.run_cache import RunCache
+from slide_agent.summarizer import merge_summaries, section_chunks, split_sections
+
+
+def test_sections_split_on_separators_and_headings():
+    text = "Intro line\n---\n# Method\nStep one\n\n## Details\nMore\n-----\n\n# Results\nGood"
+
+    assert split_sections(text) == ["Intro line", "# Method\nStep one", "## Details\nMore", "# Results\nGood"]
+
+
+def test_leading_heading_stays_with_its_section():
+    assert split_sections("\n# Title\nBody\n# Next\nText") == ["# Title\nBody", "# Next\nText"]
+
+
+def test_short_section_is_one_chunk():
+    section = "# Heading\nBody"
+
+    assert section_chunks(section, max_chars=100) == [section]
+
+
+def test_long_section_pieces_carry_the_heading():
+    section = "# Heading\n" + "\n".join(f"Line {i:02d} " + "x" * 20 for i in range(10))
+
+    chunks = section_chunks(section, max_chars=80)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 80 for chunk in chunks)
+    assert all(chunk.startswith("# Heading\n") for chunk in chunks)
+    assert [line for chunk in chunks for line in chunk.splitlines() if line != "# Heading"] == \
+        section.splitlines()[1:]
+
+
+@pytest.mark.parametrize("section", [
+    "# Heading\n" + "y" * 500,
+    "z" * 500,
+    "# " + "h" * 300 + "\nBody",
+])
+def test_oversize_lines_are_split(section):
+    chunks = section_chunks(section, max_chars=80)
+    heading = chunks[1].split("\n")[0]
+
+    assert all(len(chunk) <= 80 for chunk in chunks)
+    # Nothing is lost: the pieces after the first only add the heading
+    text = chunks[0] + "".join(chunk.removeprefix(heading + "\n") for chunk in chunks[1:])
+    assert text.replace("\n", "") == section.replace("\n", "")
+
+
+def test_merge_keeps_the_first_heading_and_all_points():
+    merged = merge_summaries([
+        SectionSummary(heading="Method", points=["a", "b"]),
+        SectionSummary(heading="Method (cont.)", points=["c"]),
+    ])
+
+    assert merged == SectionSummary(heading="Method", points=["a", "b", "c"])
+
+
+def test_summarize_chunk_skips_the_model_on_a_hit():
+    model = TestModel(custom_result_args={"heading": "Method", "points": ["a"]})
+    cache = RunCache(":memory:")
+
+    async def summarize(chunk):
+        with summarizer.summarizer_agent.override(model=model):
+            return await summarizer.summarize_chunk(chunk, cache)
+
+    first = asyncio.run(summarize("# Method\nStep one"))
+    assert first == SectionSummary(heading="Method", points=["a"])
+
+    model.last_model_request_parameters = None
+    assert asyncio.run(summarize("# Method\nStep one")) == first
+    assert model.last_model_request_parameters is None
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+    asyncio.run(summarize("# Method\nStep two"))
+    assert model.last_model_request_parameters is not None
+
+
+def test_summaries_are_accounted(runs_path):
+    model = TestModel(custom_result_args={"heading": "Method", "points": ["a"]})
+    cache = RunCache(":memory:")
+
+    async def summarize():
+        with summarizer.summarizer_agent.override(model=model):
+            return await summarizer.summarize_chunk("# Method\nStep one", cache)
+
+    asyncio.run(summarize())
+    asyncio.run(summarize())
+
+    runs = [json.loads(line) for line in runs_path.read_text().splitlines()]
+    assert [(run["stage"], run["cached"]) for run in runs] == [("summarize", False), ("summarize", True)]
+    assert runs[0]["requests"] == 1
+    assert runs[0]["prompt_tokens"] > 0
@@ -0,0 +1,85 @@
+import asyncio
+import copy
+import os
+from slide_agent.async_slide_ops import AsyncPresentationSnapshot, generate_deck_thumbnails_async
+from slide_agent.fake_slides import FakeSlidesService, make_png, make_template_presentation
+from slide_agent.thumbnail_cache import ThumbnailCache, page_fingerprint
+
+
+def render_deck(client, output_dir, cache):
+    async def run():
+        snapshot = AsyncPresentationSnapshot("deck", client)
+        return await generate_deck_thumbnails_async("deck", output_dir, snapshot, cache=cache)
+
+    return asyncio.run(run())
+
+
+def test_fingerprint_ignores_signed_urls():
+    page = make_template_presentation("deck")["slides"][0]
+    refetched = copy.deepcopy(page)
+    for element in refetched["pageElements"]:
+        if "image" in element:
+            element["image"]["contentUrl"] += "?signature=other"
+
+    assert page_fingerprint(page) == page_fingerprint(refetched)
+    assert page_fingerprint(page) != page_fingerprint(page, {"thumbnailSize": "SMALL"})
+
+
+def test_fingerprint_changes_with_page_content():
+    page = make_template_presentation("deck")["slides"][0]
+    edited = copy.deepcopy(page)
+    edited["pageElements"][0]["shape"]["text"]["textElements"][0]["textRun"]["content"] = "Edited"
+
+    assert page_fingerprint(page) != page_fingerprint(edited)
+
+
+def test_new_render_replaces_older_ones(tmp_path):
+    cache = ThumbnailCache(root=str(tmp_path / "cache"))
+    src = tmp_path / "render.png"
+    src.write_bytes(make_png())
+
+    cache.put("deck", "page", "old", str(src))
+    cache.put("deck", "page", "new", str(src))
+
+    assert cache.get("deck", "page", "old") is None
+    assert cache.get("deck", "page", "new") is not None
+    assert os.listdir(tmp_path / "cache" / "deck" / "page") == ["new.png"]
+
+
+def test_evict_drops_least_recently_used(tmp_path):
+    src = tmp_path / "render.png"
+    src.write_bytes(make_png())
+    size = src.stat().st_size
+
+    cache = ThumbnailCache(root=str(tmp_path / "cache"), max_bytes=2 * size)
+    for i, page in enumerate(["a", "b", "c"]):
+        path = cache.put("deck", page, "f", str(src))
+        os.utime(path, (1000 + i, 1000 + i))
+    os.utime(cache.get("deck", "a", "f"))
+
+    assert cache.evict() == 2 * size
+    assert cache.get("deck", "b", "f") is None
+    assert cache.get("deck", "a", "f") is not None
+    assert cache.get("deck", "c", "f") is not None
+
+
+def test_only_edited_pages_are_rendered_again(tmp_path, slides_client):
+    service = FakeSlidesService([make_template_presentation("deck")])
+    cache = ThumbnailCache(root=str(tmp_path / "cache"))
+    pages = len(service.presentations().get(presentationId="deck").execute()["slides"])
+
+    render_deck(slides_client(service), str(tmp_path / "first"), cache)
+    assert service.calls["pages.getThumbnail"] == pages
+
+    service.reset_counters()
+    paths = render_deck(slides_client(service), str(tmp_path / "second"), cache)
+    assert service.calls["pages.getThumbnail"] == 0
+    assert all(os.path.exists(path) for path in paths)
+
+    service.presentations().batchUpdate(presentationId="deck", body={"requests": [
+        {"insertText": {"objectId": "page_0001_title", "text": "Edited "}},
+        {"deleteObject": {"objectId": "page_0002"}},
+    ]}).execute()
+    service.reset_counters()
+    render_deck(slides_client(service), str(tmp_path / "third"), cache)
+    assert service.calls["pages.getThumbnail"] == 1